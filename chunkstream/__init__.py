@@ -1 +1,10 @@
-from chunkstream.chunkstream import ChunkGen
+from chunkstream.chunkstream import (
+    ChunkGen,
+    ChunkIndex,
+    ElementGen,
+    MultiChunkGen,
+    achunks,
+    build_index,
+    scan_mmap,
+    scan_parallel,
+)
@@ -0,0 +1,351 @@
+from chunkstream import (
+    ChunkGen,
+    ElementGen,
+    MultiChunkGen,
+    scan_mmap,
+    scan_parallel,
+)
+from chunkstream.chunkstream import BLOCK_SIZE
+
+import json
+import os
+import random
+import subprocess
+import sys
+from argparse import (
+    SUPPRESS,
+    ArgumentParser,
+    ArgumentTypeError,
+)
+from dataclasses import dataclass
+from functools import cached_property
+from platform import python_version
+from tempfile import mkstemp
+from time import perf_counter
+from typing import Iterator
+
+try:
+    import resource
+except ImportError:
+    # not on Windows, no memory numbers there
+    resource = None  # type: ignore
+
+# ru_maxrss is in KiB, except on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+# ---------------------------------------------------------
+def synthetic_xml(
+    chunks=5000,
+    chunk_size=256,
+    tag_length=3,
+    noise=0.5,
+    seed=0,
+) -> Iterator[str]:
+    # `noise` is the share of the output that's filler elements
+    # between the chunks we're after. Yielded piece by piece,
+    # the whole of it never has to be in memory
+    rnd = random.Random(seed)
+    name = "t" * tag_length
+    other = "n" * tag_length
+    body = "x" * chunk_size
+    if not 0 <= noise < 1:
+        raise ValueError("noise must be in [0, 1)")
+    filler = max(int(chunk_size * noise / (1 - noise)), 0)
+
+    yield "<root>"
+    for _ in range(chunks):
+        yield f"<{name}>{body}</{name}>"
+        if filler:
+            size = rnd.randint(
+                filler // 2, filler * 3 // 2
+            )
+            yield f"<{other}>{'y' * size}</{other}>"
+    yield "</root>"
+
+
+# ---------------------------------------------------------
+@dataclass(frozen=True)
+class Input:
+    path: str
+    name: str
+
+    # read on first use, so a path that only needs the file
+    # doesn't carry the input in its peak RSS
+    @cached_property
+    def text(self) -> str:
+        with open(self.path, newline="") as handler:
+            return handler.read()
+
+    @cached_property
+    def data(self) -> bytes:
+        with open(self.path, "rb") as handler:
+            return handler.read()
+
+    @property
+    def tags(self):
+        return f"<{self.name}>", f"</{self.name}>"
+
+
+def _blocks(data, size=BLOCK_SIZE):
+    # slicing rather than a StringIO/BytesIO, which would show up
+    # as a full copy of the input in the peak RSS numbers
+    for start in range(0, len(data), size):
+        stop = start + size
+        yield data[start:stop]
+
+
+def per_char(inp):
+    cg = ChunkGen(*inp.tags)
+    return sum(1 for char in inp.text if cg(char))
+
+
+def feed_str(inp):
+    cg = ChunkGen(*inp.tags)
+    return sum(
+        1 for b in _blocks(inp.text) for _ in cg.feed(b)
+    )
+
+
+def feed_bytes(inp):
+    cg = ChunkGen(*inp.tags)
+    return sum(
+        1 for b in _blocks(inp.data) for _ in cg.feed(b)
+    )
+
+
+def multi(inp):
+    mc = MultiChunkGen({inp.name: inp.tags})
+    return sum(
+        1 for b in _blocks(inp.text) for _ in mc.feed(b)
+    )
+
+
+def element(inp):
+    eg = ElementGen(inp.name)
+    return sum(
+        1 for b in _blocks(inp.text) for _ in eg.feed(b)
+    )
+
+
+def mmap_scan(inp):
+    return sum(1 for _ in scan_mmap(inp.path, *inp.tags))
+
+
+def parallel(inp):
+    return sum(
+        1 for _ in scan_parallel(inp.path, *inp.tags)
+    )
+
+
+def parallel_unordered(inp):
+    spans = scan_parallel(
+        inp.path, *inp.tags, ordered=False
+    )
+    return sum(1 for _ in spans)
+
+
+PATHS = {
+    "per_char": per_char,
+    "feed_str": feed_str,
+    "feed_bytes": feed_bytes,
+    "multi": multi,
+    "element": element,
+    "scan_mmap": mmap_scan,
+    "scan_parallel": parallel,
+    "scan_parallel_unordered": parallel_unordered,
+}
+
+
+# ---------------------------------------------------------
+def run(paths, repeat=3, **xml_opts) -> dict:
+    name = "t" * xml_opts.get("tag_length", 3)
+    fd, path = mkstemp()
+    with os.fdopen(fd, "w", newline="") as handler:
+        handler.writelines(synthetic_xml(**xml_opts))
+    size = os.path.getsize(path)
+    inp = Input(path, name)
+
+    results = {}
+    try:
+        # first, while this process is still small: a child
+        # can inherit its parent's RSS high-water mark
+        rss = {
+            label: _peak_rss(label, inp) for label in paths
+        }
+        # loaded up front here, not inside the timings
+        inp.text, inp.data
+
+        for label in paths:
+            fnc = PATHS[label]
+            best = float("inf")
+            for _ in range(repeat):
+                start = perf_counter()
+                count = fnc(inp)
+                best = min(best, perf_counter() - start)
+
+            results[label] = {
+                "seconds": best,
+                "mb_per_s": size / best / 1e6,
+                "chunks_per_s": count / best,
+                "chunks": count,
+                **rss[label],
+            }
+    finally:
+        os.remove(path)
+
+    return {
+        "commit": _commit(),
+        "python": python_version(),
+        "input_bytes": size,
+        "options": {"repeat": repeat, **xml_opts},
+        "results": results,
+    }
+
+
+def _peak_rss(label, inp) -> dict:
+    # a fresh interpreter per path, so each one starts from the
+    # same baseline and the high-water mark is its own. Counts
+    # what tracemalloc can't: mmapped pages and the workers
+    if resource is None:
+        return {}
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "chunkstream.bench_chunkstream",
+            "--rss-of",
+            label,
+            "--input",
+            inp.path,
+            "--tag-length",
+            str(len(inp.name)),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def _measure_rss(label, path, tag_length) -> dict:
+    inp = Input(path, "t" * tag_length)
+    # before running anything: interpreter and imports
+    base = resource.getrusage(
+        resource.RUSAGE_SELF
+    ).ru_maxrss
+    PATHS[label](inp)
+    own = resource.getrusage(
+        resource.RUSAGE_SELF
+    ).ru_maxrss
+    # the largest of the (reaped) worker processes
+    workers = resource.getrusage(
+        resource.RUSAGE_CHILDREN
+    ).ru_maxrss
+    return {
+        "base_rss_bytes": base * RSS_UNIT,
+        "peak_rss_bytes": own * RSS_UNIT,
+        "peak_worker_rss_bytes": workers * RSS_UNIT,
+    }
+
+
+def compare(old: dict, new: dict) -> str:
+    lines = []
+    for label, res in new["results"].items():
+        if label not in old["results"]:
+            continue
+        was = old["results"][label]["mb_per_s"]
+        now = res["mb_per_s"]
+        ratio = now / was
+        lines.append(
+            f"{label:>24}: {was:9.2f} -> {now:9.2f} MB/s ({ratio:.2f}x)"
+        )
+    return "\n".join(lines)
+
+
+def _commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+# ---------------------------------------------------------
+def noise_ratio(value) -> float:
+    noise = float(value)
+    if not 0 <= noise < 1:
+        raise ArgumentTypeError(
+            f"{value} is not in [0, 1)"
+        )
+    return noise
+
+
+def main(argv=None):
+    parser = ArgumentParser(
+        description="chunkstream benchmarks"
+    )
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument(
+        "--chunk-size", type=int, default=256
+    )
+    parser.add_argument(
+        "--tag-length", type=int, default=3
+    )
+    parser.add_argument(
+        "--noise", type=noise_ratio, default=0.5
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        choices=list(PATHS),
+        default=list(PATHS),
+    )
+    parser.add_argument(
+        "--output", help="write JSON results here"
+    )
+    parser.add_argument(
+        "--compare",
+        help="earlier JSON results to diff with",
+    )
+    # internal, what _peak_rss runs each path with
+    parser.add_argument("--rss-of", help=SUPPRESS)
+    parser.add_argument("--input", help=SUPPRESS)
+    opts = parser.parse_args(argv)
+
+    if opts.rss_of:
+        rss = _measure_rss(
+            opts.rss_of, opts.input, opts.tag_length
+        )
+        json.dump(rss, sys.stdout)
+        return
+
+    report = run(
+        opts.paths,
+        repeat=opts.repeat,
+        chunks=opts.chunks,
+        chunk_size=opts.chunk_size,
+        tag_length=opts.tag_length,
+        noise=opts.noise,
+    )
+
+    if opts.output:
+        with open(opts.output, "w") as handler:
+            json.dump(report, handler, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if opts.compare:
+        with open(opts.compare) as handler:
+            print(compare(json.load(handler), report))
+
+
+if __name__ == "__main__":
+    main()
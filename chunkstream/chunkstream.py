@@ -1,10 +1,90 @@
-from os import getenv
+import mmap
+import re
+from array import array
+from collections import deque
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed,
+)
+from itertools import accumulate, chain
+from os import (
+    O_RDONLY,
+    SEEK_SET,
+    close,
+    cpu_count,
+    fstat,
+    getenv,
+    lseek,
+    read,
+)
+from os import open as os_open
+from struct import Struct
+from sys import byteorder
+
+try:
+    from os import pread
+except ImportError:
+    # os.pread is POSIX only
+    def pread(fd, length, offset):  # type: ignore
+        lseek(fd, offset, SEEK_SET)
+        return read(fd, length)
+
 
 # default 4MiB
-MAX_CHUNK_SIZE = getenv("MAX_CHUNK_SIZE", 4 * (1024 ** 2))
+MAX_CHUNK_SIZE = getenv("MAX_CHUNK_SIZE", 4 * (1024**2))
+# default 64KiB
+BLOCK_SIZE = 64 * 1024
+# how far `scan_mmap` gets past mapped pages before dropping them
+RELEASE_SIZE = 64 * (1024**2)
+# index file header: magic, chunk count, keyed or not
+INDEX_HEADER = Struct("<8sQ?")
+INDEX_MAGIC = b"CHUNKIX1"
+
+
+class _Blocks:
+    # block-level plumbing shared by the `feed`-based scanners
+    def iter_file(self, fileobj, block_size=BLOCK_SIZE):
+        block = fileobj.read(block_size)
+        while block:
+            yield from self.feed(block)
+            block = fileobj.read(block_size)
+
+    def _extend(self, piece):
+        self._size += len(piece)
+        _check_size(self._size, self.max_chunk_size)
+        self._parts.append(piece)
+
+    def _emit(self, data, start, stop):
+        piece = data[start:stop]
+        _check_size(
+            self._size + len(piece), self.max_chunk_size
+        )
+        if self._parts:
+            parts = self._parts
+            piece = parts[0][:0].join([*parts, piece])
+        self._parts = []
+        self._size = 0
+        self._in_tag = False
+        return piece
+
+    def _straddle(self, tag, data, copy):
+        # a tag may straddle the previous block and this one
+        carry = self._carry
+        if not carry:
+            return -1
+        i = (carry + copy(data[: len(tag) - 1])).find(tag)
+        return i if i < len(carry) else -1
 
+    def _keep(self, data, copy, pos, keep):
+        # hold on to what could be the start of a tag
+        cut = max(pos, len(data) - keep)
+        tail = copy(data[cut:])
+        if pos == 0 and self._carry and len(tail) < keep:
+            tail = (self._carry + tail)[-keep:]
+        self._carry = tail
 
-class ChunkGen:
+
+class ChunkGen(_Blocks):
     def __init__(
         self, open_tag, close_tag, max_chunk_size=None
     ) -> None:
@@ -17,6 +97,18 @@ class ChunkGen:
         self._ct = TagGen(close_tag)
         self._in_tag = False
         self._chunk = None
+        self._tags = {
+            str: (_decode(open_tag), _decode(close_tag)),
+            bytes: (_encode(open_tag), _encode(close_tag)),
+        }
+        self._search = {
+            tag: re.compile(re.escape(tag)).search
+            for tag in self._tags[bytes]
+        }
+        # block-level state, see `feed`
+        self._parts: list = []
+        self._size = 0
+        self._carry = None
 
     def checksize(self):
         if self._chunk is None:
@@ -51,41 +143,716 @@ class ChunkGen:
             self._chunk = ""
             return output
 
+    # block-level alternative to the per-character `__call__`;
+    # don't mix the two on a single instance
+    def feed(self, block):
+        mode = str if isinstance(block, str) else bytes
+        ot, ct = self._tags[mode]
+        data, find, copy = _prepare(block, self._search)
+
+        pos = 0
+        start = 0
+
+        tag = ct if self._in_tag else ot
+        if (i := self._straddle(tag, data, copy)) != -1:
+            pos = i + len(tag) - len(self._carry)
+            if self._in_tag:
+                yield self._emit(data, 0, pos)
+            else:
+                self._in_tag = True
+                self._extend(self._carry[i:])
+
+        while True:
+            if not self._in_tag:
+                i = find(ot, pos)
+                if i == -1:
+                    break
+                self._in_tag = True
+                start = i
+                pos = i + len(ot)
+            else:
+                i = find(ct, pos)
+                if i == -1:
+                    break
+                pos = i + len(ct)
+                yield self._emit(data, start, pos)
+
+        if self._in_tag:
+            self._extend(copy(data[start:]))
+            keep = len(ct) - 1
+        else:
+            keep = len(ot) - 1
+
+        self._keep(data, copy, pos, keep)
+
 
 class TagGen:
     def __init__(self, tag) -> None:
         self.tag = tag
         self.pos = 0
-        self.chars = None
+        self._delta = _tag_dfa(tag)
 
     def inside_tag(self):
-        if self.chars is None:
-            return False
-        return len(self.chars) > 0
-
-    def char_in_tag(self, char):
-        return char == self.tag[self.pos]
+        return self.pos > 0
 
     def reset(self):
         self.pos = 0
-        self.chars = None
 
     def __call__(self, char):
-        if self.char_in_tag(char):
-            if not self.inside_tag():
-                self.chars = char
-            elif self.inside_tag():
-                self.chars += char
-            self.pos += 1
-        elif not self.char_in_tag(char):
-            if not self.inside_tag():
-                pass
-            elif self.inside_tag():
-                self.reset()
-
-        if self.tag == self.chars:
-            output = self.chars
+        self.pos = self._delta[self.pos].get(char, 0)
+        if self.pos == len(self.tag):
             self.reset()
-            return output
+            return self.tag
+        return None
+
+
+def _tag_dfa(tag):
+    # KMP failure function unrolled into a transition table, so
+    # a mismatch falls back to the longest matching prefix (and
+    # re-checks the current char) at one dict lookup per char
+    delta = [{tag[0]: 1}]
+    back = 0
+    for pos in range(1, len(tag)):
+        delta.append({**delta[back], tag[pos]: pos + 1})
+        back = delta[back].get(tag[pos], 0)
+    return delta
+
+
+class MultiChunkGen(_Blocks):
+    def __init__(self, tags, max_chunk_size=None) -> None:
+        self.tags = tags
+        self.max_chunk_size = (
+            max_chunk_size or MAX_CHUNK_SIZE
+        )
+        self._opens = {
+            mode: _Automaton(
+                {n: cast(o) for n, (o, _) in tags.items()}
+            )
+            for mode, cast in (
+                (str, _decode),
+                (bytes, _encode),
+            )
+        }
+        self._closes = {
+            mode: {
+                n: cast(c) for n, (_, c) in tags.items()
+            }
+            for mode, cast in (
+                (str, _decode),
+                (bytes, _encode),
+            )
+        }
+        self._search = {
+            tag: re.compile(re.escape(tag)).search
+            for tag in self._closes[bytes].values()
+        }
+        self._state = 0
+        self._name = None
+        self._in_tag = False
+        self._parts: list = []
+        self._size = 0
+        self._carry = None
+
+    # like `ChunkGen.feed`, but yields (name, chunk) pairs for
+    # every tag in one pass
+    def feed(self, block):
+        mode = str if isinstance(block, str) else bytes
+        opens, closes = (
+            self._opens[mode],
+            self._closes[mode],
+        )
+        data, find, copy = _prepare(block, self._search)
+        pos = 0
+        start = 0
+
+        if self._in_tag:
+            ct = closes[self._name]
+            if (i := self._straddle(ct, data, copy)) != -1:
+                pos = i + len(ct) - len(self._carry)
+                yield self._name, self._emit(data, 0, pos)
+
+        while True:
+            if not self._in_tag:
+                self._state, pos, name = opens(
+                    data, pos, self._state
+                )
+                if name is None:
+                    break
+                ot = opens.patterns[name]
+                start = pos - len(ot)
+                if start < 0:
+                    # the open tag began in an earlier block
+                    self._extend(ot[:-start])
+                    start = 0
+                self._in_tag = True
+                self._name = name
+            else:
+                ct = closes[self._name]
+                i = find(ct, pos)
+                if i == -1:
+                    break
+                pos = i + len(ct)
+                yield self._name, self._emit(
+                    data, start, pos
+                )
+
+        if self._in_tag:
+            self._extend(copy(data[start:]))
+            keep = len(closes[self._name]) - 1
+            self._keep(data, copy, pos, keep)
         else:
+            self._carry = None
+
+
+class ElementGen(_Blocks):
+    # matches whole <name ...>...</name> elements by name rather
+    # than by literal tags: open tags may carry attributes (or
+    # self-close), and nested elements of the same name stay
+    # inside the outermost one. Still one streaming pass with no
+    # DOM, so comments and CDATA aren't special-cased
+    def __init__(self, name, max_chunk_size=None) -> None:
+        self.name = name
+        self.max_chunk_size = (
+            max_chunk_size or MAX_CHUNK_SIZE
+        )
+        self._patterns = {
+            str: _element_patterns(_decode(name)),
+            bytes: _element_patterns(_encode(name)),
+        }
+        # longest prefix of a token we can't classify yet: "</name"
+        self._margin = len(_encode(name)) + 2
+        self._depth = 0
+        self._in_tag = False
+        self._parts: list = []
+        self._size = 0
+        self._carry = None
+
+    def feed(self, block):
+        mode = str if isinstance(block, str) else bytes
+        token, attrs, closing, slash = self._patterns[mode]
+        data, _, copy = _prepare(block, None)
+        buf = (
+            self._carry + copy(data)
+            if self._carry
+            else data
+        )
+        end = len(buf)
+        pos = 0
+        start = 0
+
+        while True:
+            m = token(buf, pos)
+            if m is None:
+                keep = max(pos, end - self._margin)
+                break
+
+            if m.group(1):
+                tail = closing(buf, m.end())
+                if not tail.group(1):
+                    if tail.end() == end:
+                        keep = m.start()
+                        break
+                    pos = tail.end()
+                    continue
+                pos = tail.end()
+                if self._depth:
+                    self._depth -= 1
+                    if not self._depth:
+                        yield self._emit(buf, start, pos)
+                continue
+
+            tail = attrs(buf, m.end())
+            if tail is None:
+                # no closing ">" yet, wait for the next block
+                keep = m.start()
+                break
+            pos = tail.end()
+            if not self._depth:
+                start = m.start()
+            if buf[pos - 2] == slash:
+                if not self._depth:
+                    yield self._emit(buf, start, pos)
+                continue
+            self._depth += 1
+
+        if self._depth:
+            self._extend(copy(buf[start:keep]))
+        self._carry = copy(buf[keep:])
+        _check_size(len(self._carry), self.max_chunk_size)
+
+
+def _element_patterns(name):
+    token = rf"<(/?){re.escape(_decode(name))}(?=[\s/>])"
+    attrs = r"""(?:[^>"']|"[^"]*"|'[^']*')*>"""
+    closing = r"\s*(>)?"
+    patterns = [token, attrs, closing]
+    if not isinstance(name, str):
+        patterns = [p.encode() for p in patterns]
+    token, attrs, closing = map(re.compile, patterns)
+    slash = "/" if isinstance(name, str) else ord("/")
+    return token.search, attrs.match, closing.match, slash
+
+
+class _Automaton:
+    # Aho-Corasick over all the open tags, flattened into a full
+    # DFA so every symbol costs one dict lookup no matter how
+    # many tags there are
+    def __init__(self, patterns) -> None:
+        self.patterns = patterns
+        self.out: dict = {}
+        goto: list = [{}]
+        for name, pattern in patterns.items():
+            state = 0
+            for symbol in pattern:
+                if symbol not in goto[state]:
+                    goto[state][symbol] = len(goto)
+                    goto.append({})
+                state = goto[state][symbol]
+            self.out.setdefault(state, name)
+
+        fail = [0] * len(goto)
+        self.delta = [dict(g) for g in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            back = fail[state]
+            for symbol, nxt in self.delta[back].items():
+                self.delta[state].setdefault(symbol, nxt)
+            if state not in self.out and back in self.out:
+                self.out[state] = self.out[back]
+            for symbol, nxt in goto[state].items():
+                fail[nxt] = self.delta[back].get(symbol, 0)
+                queue.append(nxt)
+
+        # from the root, jump straight to the next symbol that
+        # can start a tag (usually just "<")
+        self._skip = _charset(list(goto[0])).search
+
+    def __call__(self, data, pos, state):
+        delta, out, skip = self.delta, self.out, self._skip
+        end = len(data)
+        while pos < end:
+            if not state:
+                match = skip(data, pos)
+                if match is None:
+                    return 0, end, None
+                pos = match.start()
+            state = delta[state].get(data[pos], 0)
+            pos += 1
+            if state in out:
+                return 0, pos, out[state]
+        return state, pos, None
+
+
+# ---------------------------------------------------------
+async def achunks(
+    source,
+    open_tag,
+    close_tag,
+    max_chunk_size=None,
+    block_size=BLOCK_SIZE,
+):
+    # nothing is read until the consumer asks for the next chunk,
+    # so a slow consumer pushes back on the stream
+    cg = ChunkGen(open_tag, close_tag, max_chunk_size)
+    async for block in _ablocks(source, block_size):
+        for chunk in cg.feed(block):
+            yield chunk
+
+
+async def _ablocks(source, block_size):
+    # asyncio.StreamReader, or anything else with an async read
+    if hasattr(source, "read"):
+        while block := await source.read(block_size):
+            yield block
+    else:
+        async for block in source:
+            yield block
+
+
+def scan_mmap(
+    path,
+    open_tag,
+    close_tag,
+    max_chunk_size=None,
+    views=False,
+):
+    ot, ct = _encode(open_tag), _encode(close_tag)
+    limit = max_chunk_size or MAX_CHUNK_SIZE
+
+    mm = _map(path)
+    if mm is None:
+        return
+
+    view = memoryview(mm)
+    try:
+        _madvise(mm, "MADV_SEQUENTIAL")
+        dropped = 0
+        for offset, length in _spans(mm, ot, ct, limit):
+            if length < 0:
+                _check_size(len(mm) - offset, limit)
+            if views:
+                stop = offset + length
+                yield view[offset:stop]
+            else:
+                yield offset, length
+            # keep RSS flat by handing back pages we're done with
+            if offset - dropped >= RELEASE_SIZE:
+                done = offset - offset % mmap.PAGESIZE
+                size = done - dropped
+                _madvise(
+                    mm, "MADV_DONTNEED", dropped, size
+                )
+                dropped = done
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            # caller still holds views, let gc unmap it later
+            pass
+
+
+def scan_parallel(
+    path,
+    open_tag,
+    close_tag,
+    max_chunk_size=None,
+    views=False,
+    workers=None,
+    shard_size=None,
+    ordered=True,
+):
+    ot, ct = _encode(open_tag), _encode(close_tag)
+    limit = max_chunk_size or MAX_CHUNK_SIZE
+
+    mm = _map(path)
+    if mm is None:
+        return
+
+    workers = workers or cpu_count() or 1
+    shard_size = shard_size or max(
+        -(-len(mm) // (4 * workers)), BLOCK_SIZE
+    )
+    starts = range(0, len(mm), shard_size)
+
+    view = memoryview(mm)
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = {
+                pool.submit(
+                    _shard_spans,
+                    path,
+                    ot,
+                    ct,
+                    limit,
+                    start,
+                    start + shard_size,
+                ): n
+                for n, start in enumerate(starts)
+            }
+            stitch = _Stitch(mm, ot, ct, limit)
+            if ordered:
+                spans = _ordered(stitch, futures)
+            else:
+                spans = _unordered(
+                    stitch, starts, limit, futures
+                )
+            for offset, length in spans:
+                if length < 0:
+                    _check_size(len(mm) - offset, limit)
+                if views:
+                    stop = offset + length
+                    yield view[offset:stop]
+                else:
+                    yield offset, length
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            pass
+
+
+def _shard_spans(
+    path, open_tag, close_tag, limit, start, stop
+):
+    # runs in a worker process: resync on the first open tag at
+    # or after `start`, and own every chunk opening before `stop`
+    # (even the ones that end past it)
+    mm = _map(path)
+    if mm is None:
+        return array("q")
+    with mm:
+        spans = _spans(
+            mm, open_tag, close_tag, limit, start, stop
+        )
+        return array("q", chain.from_iterable(spans))
+
+
+class _Stitch:
+    # a worker that resynced inside a chunk from the previous
+    # shard reports a bogus chunk ending where the real one does,
+    # so drop whatever starts before the last chunk's end, and
+    # scan any gap up to a worker's first good chunk ourselves to
+    # stay identical to a single sequential pass
+    def __init__(
+        self, mm, open_tag, close_tag, limit
+    ) -> None:
+        self._scan = lambda start, stop=None: _spans(
+            mm, open_tag, close_tag, limit, start, stop
+        )
+        self.last = 0
+
+    def __call__(self, shard):
+        synced = False
+        for n in range(0, len(shard), 2):
+            offset, length = shard[n], shard[n + 1]
+            if offset < self.last:
+                continue
+            if not synced:
+                for span in self._scan(self.last, offset):
+                    yield span
+                    self.last = span[0] + span[1]
+                synced = offset >= self.last
+                if not synced:
+                    continue
+            yield offset, length
+            self.last = offset + length
+
+    def rest(self):
+        yield from self._scan(self.last)
+
+
+def _ordered(stitch, futures):
+    for future in futures:
+        yield from stitch(future.result())
+    yield from stitch.rest()
+
+
+def _unordered(stitch, starts, limit, futures):
+    # a chunk from an earlier shard ends within max_chunk_size of
+    # the shard start, so past that (and the first chunk there)
+    # a shard's chunks are final as soon as it's done; only the
+    # heads wait to be stitched in file order
+    done = {}
+    following = 0
+    for future in as_completed(futures):
+        shard = future.result()
+        edge = starts[futures[future]] + limit
+        cut = 0
+        while cut < len(shard) and shard[cut] < edge:
+            cut += 2
+        cut = min(cut + 2, len(shard))
+        for n in range(cut, len(shard), 2):
+            yield shard[n], shard[n + 1]
+        done[futures[future]] = (shard, cut)
+
+        while following in done:
+            shard, cut = done.pop(following)
+            yield from stitch(shard[:cut])
+            if cut < len(shard):
+                stitch.last = shard[-2] + shard[-1]
+            following += 1
+    yield from stitch.rest()
+
+
+# ---------------------------------------------------------
+def build_index(
+    path,
+    open_tag,
+    close_tag,
+    index_path,
+    key=None,
+    max_chunk_size=None,
+):
+    # one scan_mmap pass, written out as little-endian arrays:
+    # offsets, lengths and, when keyed, the chunk numbers in key
+    # order plus the end of each key in a blob of sorted keys
+    offsets, lengths = array("Q"), array("Q")
+    keys = []
+    mm = _map(path) if key else None
+    try:
+        spans = scan_mmap(
+            path, open_tag, close_tag, max_chunk_size
+        )
+        for offset, length in spans:
+            offsets.append(offset)
+            lengths.append(length)
+            if mm is not None:
+                stop = offset + length
+                keys.append(_encode(key(mm[offset:stop])))
+    finally:
+        if mm is not None:
+            mm.close()
+
+    with open(index_path, "wb") as handler:
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC, len(offsets), key is not None
+        )
+        handler.write(header)
+        _write_array(handler, offsets)
+        _write_array(handler, lengths)
+        if key is not None:
+            order = sorted(
+                range(len(keys)), key=keys.__getitem__
+            )
+            ends = accumulate(len(keys[n]) for n in order)
+            _write_array(handler, array("Q", order))
+            _write_array(handler, array("Q", ends))
+            handler.write(b"".join(keys[n] for n in order))
+
+
+class ChunkIndex:
+    # random access to the chunks of `path` through an index from
+    # `build_index`: the nth chunk in O(1), a keyed one in
+    # O(log n), each fetched with a single pread
+    def __init__(self, index_path, path) -> None:
+        self.path = path
+        with open(index_path, "rb") as handler:
+            header = handler.read(INDEX_HEADER.size)
+            magic, count, keyed = INDEX_HEADER.unpack(
+                header
+            )
+            if magic != INDEX_MAGIC:
+                msg = f"{index_path} is not a chunk index"
+                raise ValueError(msg)
+            self._offsets = _read_array(handler, count)
+            self._lengths = _read_array(handler, count)
+            self._order = _read_array(
+                handler, count * keyed
+            )
+            self._ends = _read_array(
+                handler, count * keyed
+            )
+            self._keys = handler.read()
+        self._fd = os_open(path, O_RDONLY)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __getitem__(self, n):
+        offset, length = self._offsets[n], self._lengths[n]
+        return pread(self._fd, length, offset)
+
+    def get(self, key, default=None):
+        key = _encode(key)
+        lo, hi = 0, len(self._order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._order) and self._key(lo) == key:
+            return self[self._order[lo]]
+        return default
+
+    def close(self):
+        close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _key(self, n):
+        start = self._ends[n - 1] if n else 0
+        stop = self._ends[n]
+        return self._keys[start:stop]
+
+
+def _write_array(handler, values):
+    if byteorder == "big":
+        values.byteswap()
+    values.tofile(handler)
+
+
+def _read_array(handler, count):
+    values = array("Q")
+    values.fromfile(handler, count)
+    if byteorder == "big":
+        values.byteswap()
+    return values
+
+
+# ---------------------------------------------------------
+def _spans(
+    buf, open_tag, close_tag, limit, start=0, stop=None
+):
+    find = buf.find
+    lo, lc = len(open_tag), len(close_tag)
+    end = len(buf) if stop is None else stop + lo - 1
+    pos = start
+    while (i := find(open_tag, pos, end)) != -1:
+        # never look further than max_chunk_size past the open
+        j = find(close_tag, i + lo, i + limit)
+        if j == -1:
+            if len(buf) - i > limit:
+                # leave raising to the caller, a worker can't tell
+                # if a sequential pass would ever get here
+                yield i, -1
+            return
+        pos = j + lc
+        yield i, pos - i
+
+
+def _map(path):
+    with open(path, "rb") as handler:
+        if not fstat(handler.fileno()).st_size:
             return None
+        return mmap.mmap(
+            handler.fileno(), 0, access=mmap.ACCESS_READ
+        )
+
+
+def _madvise(mm, option, *args):
+    if hasattr(mm, "madvise") and hasattr(mmap, option):
+        mm.madvise(getattr(mmap, option), *args)
+
+
+def _check_size(size, limit):
+    if size > limit:
+        msg = (
+            f"Chunk larger than max_chunk_size ({limit}b)"
+        )
+        raise IOError(msg)
+
+
+def _encode(tag):
+    return tag.encode() if isinstance(tag, str) else tag
+
+
+def _decode(tag):
+    return tag if isinstance(tag, str) else tag.decode()
+
+
+def _charset(symbols):
+    if isinstance(symbols[0], int):
+        chars = re.escape(bytes(symbols))
+        return re.compile(b"[" + chars + b"]")
+    chars = re.escape("".join(symbols))
+    return re.compile(f"[{chars}]")
+
+
+def _prepare(block, search):
+    if isinstance(block, str):
+        return block, block.find, str
+    # binary mode: chunks that fit inside `block` come back as
+    # zero-copy memoryview slices of it, only chunks spanning
+    # blocks get copied
+    data = memoryview(block).cast("B")
+    return data, _finder(block, data, search), bytes
+
+
+def _finder(block, data, search):
+    if isinstance(block, (bytes, bytearray)):
+        return block.find
+
+    # memoryviews have no `find`, but `re` scans them in place
+    def find(tag, pos):
+        match = search[tag](data, pos)
+        return match.start() if match else -1
+
+    return find
@@ -1,10 +1,38 @@
-from chunkstream import ChunkGen
+from chunkstream import (
+    ChunkGen,
+    ChunkIndex,
+    ElementGen,
+    MultiChunkGen,
+    achunks,
+    build_index,
+    scan_mmap,
+    scan_parallel,
+)
+from chunkstream.chunkstream import TagGen
 
+import asyncio
+import os
+import random
 import unittest
 from io import BytesIO, StringIO
+from tempfile import mkstemp
 from textwrap import dedent
 
 
+XML = dedent(
+    """\
+<root>
+    <crap>
+        <tag>hello world</tag>
+    </crap>
+    <crap>
+        <tag>goodbye world</tag>
+    </crap>
+</root>
+"""
+).strip()
+
+
 def buffered_char_stream(handler, size=16):
     segment = handler.read(size)
 
@@ -98,3 +126,414 @@ class TestChunkGen(unittest.TestCase):
             if chunk := cg(char):
                 actual.append(chunk)
         self.assertEqual(expect, actual)
+
+
+class TestChunkGenFeed(unittest.TestCase):
+    def test_matches_char_path(self):
+        cg = ChunkGen("<tag>", "</tag>")
+        expect = [c for c in map(cg, XML) if c]
+
+        for size in (1, 2, 3, 5, 7, 16, 1024):
+            with self.subTest(block_size=size):
+                cg = ChunkGen("<tag>", "</tag>")
+                handler = StringIO(XML)
+                actual = list(cg.iter_file(handler, size))
+                self.assertEqual(expect, actual)
+
+    def test_with_bytes(self):
+        handler = BytesIO(XML.encode())
+        cg = ChunkGen("<tag>", "</tag>")
+
+        expect = [
+            b"<tag>hello world</tag>",
+            b"<tag>goodbye world</tag>",
+        ]
+        actual = list(cg.iter_file(handler, 4))
+        self.assertEqual(expect, actual)
+
+    def test_tags_straddle_blocks(self):
+        cg = ChunkGen("<tag>", "</tag>")
+        blocks = [
+            "xx<t",
+            "a",
+            "g>hi</ta",
+            "g><tag>",
+            "yo</tag>",
+        ]
+
+        expect = ["<tag>hi</tag>", "<tag>yo</tag>"]
+        actual = [c for b in blocks for c in cg.feed(b)]
+        self.assertEqual(expect, actual)
+
+    def test_overflow(self):
+        handler = StringIO(XML)
+        cg = ChunkGen("<tag>", "</tag>", 8)
+
+        with self.assertRaises(IOError):
+            list(cg.iter_file(handler, 4))
+
+    def test_memoryview_slices(self):
+        block = bytearray(XML.encode())
+        cg = ChunkGen("<tag>", "</tag>")
+
+        actual = list(cg.feed(memoryview(block)))
+        with self.subTest(msg="zero-copy"):
+            for chunk in actual:
+                self.assertIsInstance(chunk, memoryview)
+                self.assertIs(chunk.obj, block)
+        with self.subTest(msg="contents"):
+            expect = [
+                b"<tag>hello world</tag>",
+                b"<tag>goodbye world</tag>",
+            ]
+            self.assertEqual(
+                expect, [bytes(c) for c in actual]
+            )
+
+    def test_reused_buffer(self):
+        handler = BytesIO(XML.encode())
+        cg = ChunkGen(b"<tag>", b"</tag>")
+        buffer = bytearray(7)
+
+        expect = [
+            b"<tag>hello world</tag>",
+            b"<tag>goodbye world</tag>",
+        ]
+        actual = []
+        while n := handler.readinto(buffer):
+            view = memoryview(buffer)[:n]
+            actual.extend(bytes(c) for c in cg.feed(view))
+        self.assertEqual(expect, actual)
+
+
+class TestScanMmap(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = mkstemp()
+        with os.fdopen(fd, "wb") as handler:
+            handler.write(XML.encode())
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_spans(self):
+        spans = list(
+            scan_mmap(self.path, "<tag>", "</tag>")
+        )
+        expect = [
+            b"<tag>hello world</tag>",
+            b"<tag>goodbye world</tag>",
+        ]
+        data = XML.encode()
+        actual = [data[o:][:n] for o, n in spans]
+        self.assertEqual(expect, actual)
+
+    def test_views(self):
+        expect = [
+            b"<tag>hello world</tag>",
+            b"<tag>goodbye world</tag>",
+        ]
+        actual = [
+            bytes(v)
+            for v in scan_mmap(
+                self.path, "<tag>", "</tag>", views=True
+            )
+        ]
+        self.assertEqual(expect, actual)
+
+    def test_overflow(self):
+        with self.assertRaises(IOError):
+            list(
+                scan_mmap(self.path, "<tag>", "</tag>", 8)
+            )
+
+    def test_empty_file(self):
+        open(self.path, "wb").close()
+        actual = list(
+            scan_mmap(self.path, "<tag>", "</tag>")
+        )
+        self.assertEqual([], actual)
+
+
+class TestScanParallel(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = mkstemp()
+        with os.fdopen(fd, "wb") as handler:
+            handler.write(XML.encode())
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def scan(self, **kwargs):
+        return list(
+            scan_parallel(
+                self.path,
+                "<tag>",
+                "</tag>",
+                workers=2,
+                shard_size=7,
+                **kwargs,
+            )
+        )
+
+    def test_matches_sequential(self):
+        expect = list(
+            scan_mmap(self.path, "<tag>", "</tag>")
+        )
+        with self.subTest(msg="ordered"):
+            self.assertEqual(expect, self.scan())
+        with self.subTest(msg="unordered"):
+            actual = sorted(self.scan(ordered=False))
+            self.assertEqual(expect, actual)
+
+    def test_open_tag_inside_chunk(self):
+        # shards starting inside the outer chunk resync on the
+        # inner open tag, which a sequential pass never sees
+        with open(self.path, "wb") as handler:
+            handler.write(
+                b"<tag>a<tag>b</tag>c<tag>d</tag>"
+            )
+
+        expect = [(0, 18), (19, 12)]
+        self.assertEqual(expect, self.scan())
+
+    def test_overflow(self):
+        with self.assertRaises(IOError):
+            self.scan(max_chunk_size=8)
+
+
+class TestMultiChunkGen(unittest.TestCase):
+    TAGS = {
+        "order": ("<order>", "</order>"),
+        "invoice": ("<invoice>", "</invoice>"),
+        "refund": ("<refund>", "</refund>"),
+    }
+    STRING = (
+        "<root><order>1</order><crap>x</crap>"
+        "<invoice>2</invoice><refund>3</refund>"
+        "<order>4</order></root>"
+    )
+
+    def test_single_pass(self):
+        expect = [
+            ("order", "<order>1</order>"),
+            ("invoice", "<invoice>2</invoice>"),
+            ("refund", "<refund>3</refund>"),
+            ("order", "<order>4</order>"),
+        ]
+        for size in (1, 2, 3, 7, 1024):
+            with self.subTest(block_size=size):
+                mc = MultiChunkGen(self.TAGS)
+                handler = StringIO(self.STRING)
+                actual = list(mc.iter_file(handler, size))
+                self.assertEqual(expect, actual)
+
+    def test_matches_chunkgen(self):
+        for name, (ot, ct) in self.TAGS.items():
+            with self.subTest(tag=name):
+                cg = ChunkGen(ot, ct)
+                expect = list(cg.feed(self.STRING))
+                mc = MultiChunkGen(self.TAGS)
+                actual = [
+                    c
+                    for n, c in mc.feed(self.STRING)
+                    if n == name
+                ]
+                self.assertEqual(expect, actual)
+
+    def test_with_bytes(self):
+        handler = BytesIO(self.STRING.encode())
+        mc = MultiChunkGen(self.TAGS)
+
+        expect = [
+            ("order", b"<order>1</order>"),
+            ("invoice", b"<invoice>2</invoice>"),
+            ("refund", b"<refund>3</refund>"),
+            ("order", b"<order>4</order>"),
+        ]
+        actual = list(mc.iter_file(handler, 5))
+        self.assertEqual(expect, actual)
+
+    def test_overflow(self):
+        handler = StringIO(self.STRING)
+        mc = MultiChunkGen(self.TAGS, 16)
+
+        with self.assertRaises(IOError):
+            list(mc.iter_file(handler, 4))
+
+
+class TestTagGen(unittest.TestCase):
+    def test_overlapping_prefix(self):
+        cg = ChunkGen("<tag>", "</tag>")
+        actual = [
+            c for c in map(cg, "<<tag>hi</ta</tag>") if c
+        ]
+        self.assertEqual(["<tag>hi</ta</tag>"], actual)
+
+    def test_matches_str_find(self):
+        rnd = random.Random(0)
+        for _ in range(2000):
+            tag = "".join(
+                rnd.choices("ab<", k=rnd.randint(1, 4))
+            )
+            text = "".join(
+                rnd.choices("ab<>", k=rnd.randint(0, 40))
+            )
+
+            expect = []
+            pos = text.find(tag)
+            while pos != -1:
+                expect.append(pos + len(tag))
+                pos = text.find(tag, pos + len(tag))
+
+            tg = TagGen(tag)
+            actual = [
+                n + 1
+                for n, char in enumerate(text)
+                if tg(char)
+            ]
+            self.assertEqual(expect, actual, (tag, text))
+
+
+class TestAchunks(unittest.TestCase):
+    EXPECT = [
+        b"<tag>hello world</tag>",
+        b"<tag>goodbye world</tag>",
+    ]
+
+    def test_stream_reader(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(XML.encode())
+            reader.feed_eof()
+            chunks = achunks(
+                reader, "<tag>", "</tag>", block_size=4
+            )
+            return [bytes(c) async for c in chunks]
+
+        self.assertEqual(self.EXPECT, asyncio.run(run()))
+
+    def test_async_iterator(self):
+        async def blocks():
+            handler = BytesIO(XML.encode())
+            while block := handler.read(5):
+                yield block
+
+        async def run():
+            chunks = achunks(blocks(), "<tag>", "</tag>")
+            return [bytes(c) async for c in chunks]
+
+        self.assertEqual(self.EXPECT, asyncio.run(run()))
+
+    def test_overflow(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(XML.encode())
+            reader.feed_eof()
+            async for _ in achunks(
+                reader, "<tag>", "</tag>", 8
+            ):
+                pass
+
+        with self.assertRaises(IOError):
+            asyncio.run(run())
+
+
+class TestElementGen(unittest.TestCase):
+    STRING = dedent(
+        """\
+    <root>
+        <tag id="1"><tag>inner</tag></tag>
+        <tags>not this one</tags>
+        <tag a='x>y' />
+        <tag
+            b="2">last</tag >
+    </root>
+    """
+    )
+
+    def test_attributes_and_nesting(self):
+        expect = [
+            '<tag id="1"><tag>inner</tag></tag>',
+            "<tag a='x>y' />",
+            '<tag\n        b="2">last</tag >',
+        ]
+        for size in (1, 2, 3, 7, 1024):
+            with self.subTest(block_size=size):
+                eg = ElementGen("tag")
+                handler = StringIO(self.STRING)
+                actual = list(eg.iter_file(handler, size))
+                self.assertEqual(expect, actual)
+
+    def test_with_bytes(self):
+        handler = BytesIO(self.STRING.encode())
+        eg = ElementGen("tag")
+
+        expect = [
+            b'<tag id="1"><tag>inner</tag></tag>',
+            b"<tag a='x>y' />",
+            b'<tag\n        b="2">last</tag >',
+        ]
+        actual = list(eg.iter_file(handler, 5))
+        self.assertEqual(expect, actual)
+
+    def test_overflow(self):
+        handler = StringIO(self.STRING)
+        eg = ElementGen("tag", 16)
+
+        with self.assertRaises(IOError):
+            list(eg.iter_file(handler, 4))
+
+
+class TestChunkIndex(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = mkstemp()
+        with os.fdopen(fd, "wb") as handler:
+            handler.write(XML.encode())
+        fd, self.index_path = mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.remove(self.index_path)
+
+    def test_nth_chunk(self):
+        build_index(
+            self.path, "<tag>", "</tag>", self.index_path
+        )
+        with ChunkIndex(
+            self.index_path, self.path
+        ) as index:
+            with self.subTest(msg="len"):
+                self.assertEqual(2, len(index))
+            with self.subTest(msg="first"):
+                expect = b"<tag>hello world</tag>"
+                self.assertEqual(expect, index[0])
+            with self.subTest(msg="last"):
+                expect = b"<tag>goodbye world</tag>"
+                self.assertEqual(expect, index[-1])
+            with self.subTest(msg="unkeyed"):
+                self.assertIsNone(index.get("hello"))
+
+    def test_keyed_chunk(self):
+        key = lambda chunk: chunk[5:-6].split()[0].decode()
+        build_index(
+            self.path,
+            "<tag>",
+            "</tag>",
+            self.index_path,
+            key,
+        )
+        with ChunkIndex(
+            self.index_path, self.path
+        ) as index:
+            with self.subTest(msg="hit"):
+                expect = b"<tag>goodbye world</tag>"
+                self.assertEqual(
+                    expect, index.get("goodbye")
+                )
+            with self.subTest(msg="miss"):
+                self.assertIsNone(index.get("world"))
+
+    def test_not_an_index(self):
+        with self.assertRaises(ValueError):
+            ChunkIndex(self.path, self.path)
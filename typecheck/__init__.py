@@ -1 +1 @@
-from typecheck.typecheck import typecheck
+from typecheck.typecheck import Containers, typecheck
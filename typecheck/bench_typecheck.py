@@ -0,0 +1,152 @@
+from typecheck.typecheck import (
+    check_types,
+    get_fnc_annotations,
+    parse_inputs,
+    typecheck,
+)
+
+import json
+from argparse import ArgumentParser
+from functools import wraps
+from platform import python_version
+from timeit import Timer
+from typing import List, Optional
+
+
+# ---------------------------------------------------------
+def positional(a: int, b: str, c: float = 3.0):
+    return a
+
+
+def keywords(a: int, *, b: str, c: float = 3.0):
+    return a
+
+
+def varargs(*args: int):
+    return args
+
+
+def generic(a: Optional[int], b: List[int]):
+    return a
+
+
+# name: (function, args, kwargs)
+SIGNATURES = {
+    "positional": (positional, (1, "x"), {}),
+    "keywords": (keywords, (1,), {"b": "x"}),
+    "varargs": (varargs, (1, 2, 3, 4), {}),
+    "generic": (generic, (1, [1, 2, 3]), {}),
+}
+
+
+# ---------------------------------------------------------
+def interpretive(fnc):
+    # what @typecheck used to do on every call
+    @wraps(fnc)
+    def decorator(*args, **kwargs):
+        values = parse_inputs(
+            fnc=fnc, args=args, kwargs=kwargs
+        )
+        typehints = get_fnc_annotations(fnc)
+        check_types(values, typehints)
+        return fnc(*args, **kwargs)
+
+    return decorator
+
+
+PATHS = {
+    "undecorated": lambda fnc: fnc,
+    "interpretive": interpretive,
+    "plan": typecheck,
+    "codegen": typecheck(codegen=True),
+}
+
+
+# ---------------------------------------------------------
+def run(
+    paths, signatures, repeat=5, number=100_000
+) -> dict:
+    results: dict = {}
+    for sig in signatures:
+        fnc, args, kwargs = SIGNATURES[sig]
+        results[sig] = {}
+        for label in paths:
+            wrapped = PATHS[label](fnc)
+            timer = Timer(lambda: wrapped(*args, **kwargs))
+            best = (
+                min(timer.repeat(repeat, number)) / number
+            )
+            results[sig][label] = {
+                "ns_per_call": best * 1e9
+            }
+
+        if "undecorated" in results[sig]:
+            base = results[sig]["undecorated"][
+                "ns_per_call"
+            ]
+            for res in results[sig].values():
+                res["vs_undecorated"] = (
+                    res["ns_per_call"] / base
+                )
+
+    return {
+        "python": python_version(),
+        "options": {"repeat": repeat, "number": number},
+        "results": results,
+    }
+
+
+def table(report: dict) -> str:
+    lines = []
+    for sig, res in report["results"].items():
+        for label, times in res.items():
+            ratio = times.get(
+                "vs_undecorated", float("nan")
+            )
+            lines.append(
+                f"{sig:>12} {label:>14}: {times['ns_per_call']:9.0f} ns ({ratio:.1f}x)"
+            )
+    return "\n".join(lines)
+
+
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = ArgumentParser(
+        description="typecheck benchmarks"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--number", type=int, default=100_000
+    )
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        choices=list(PATHS),
+        default=list(PATHS),
+    )
+    parser.add_argument(
+        "--signatures",
+        nargs="+",
+        choices=list(SIGNATURES),
+        default=list(SIGNATURES),
+    )
+    parser.add_argument(
+        "--output", help="write JSON results here"
+    )
+    opts = parser.parse_args(argv)
+
+    report = run(
+        opts.paths,
+        opts.signatures,
+        repeat=opts.repeat,
+        number=opts.number,
+    )
+
+    if opts.output:
+        with open(opts.output, "w") as handler:
+            json.dump(report, handler, indent=2)
+    print(table(report))
+
+
+if __name__ == "__main__":
+    main()
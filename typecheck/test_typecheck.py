@@ -1,5 +1,7 @@
 from typecheck.typecheck import (
     check_types,
+    Containers,
+    get_type_checker,
     parse_inputs,
     typecheck,
     Input,
@@ -8,8 +10,26 @@ from typecheck.typecheck import (
     TypeCheckError,
 )
 
+import collections
 import unittest
-from typing import List, Optional, Union
+from unittest.mock import patch
+from abc import ABC
+import warnings
+from inspect import signature
+from typing import (
+    Any,
+    Callable,
+    Counter,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 
 class test_typecheck(unittest.TestCase):
@@ -148,6 +168,478 @@ class test_typecheck_exceptions(unittest.TestCase):
         with self.assertRaises(TypeCheckError):
             fnc(["a", "b", 3])
 
+    def test_too_many_args(self):
+        @typecheck
+        def fnc(a: int):
+            pass
+
+        with self.assertRaises(TypeCheckError):
+            fnc(1, 2)
+
+    def test_unexpected_kwarg(self):
+        @typecheck
+        def fnc(a: int):
+            pass
+
+        with self.assertRaises(TypeCheckError):
+            fnc(1, b=2)
+
+    def test_wrong_keyword_arg(self):
+        @typecheck
+        def fnc(a: int):
+            pass
+
+        with self.assertRaises(TypeCheckError):
+            fnc(a="1")
+
+    def test_wrong_varargs(self):
+        @typecheck
+        def fnc(*args: int):
+            pass
+
+        with self.assertRaises(TypeCheckError):
+            fnc(1, "2")
+
+    def test_wrong_varkw(self):
+        @typecheck
+        def fnc(**kwargs: int):
+            pass
+
+        with self.assertRaises(TypeCheckError):
+            fnc(a=1, b="2")
+
+
+class test_typecheck_binding(unittest.TestCase):
+    def test_keyword_arg(self):
+        @typecheck
+        def fnc(a: int, b: str):
+            return a, b
+
+        self.assertEqual(fnc(1, b="2"), (1, "2"))
+
+    def test_defaults_not_checked(self):
+        @typecheck
+        def fnc(a: int, b: str = None, *, c: str = None):
+            return a
+
+        self.assertEqual(fnc(1), 1)
+
+    def test_methods(self):
+        class Foo:
+            @typecheck
+            def fnc(self, a: int):
+                return a
+
+        with self.subTest("ok"):
+            self.assertEqual(Foo().fnc(1), 1)
+        with self.subTest("wrong type"):
+            with self.assertRaises(TypeCheckError):
+                Foo().fnc("1")
+
+
+class test_typecheck_class_hints(unittest.TestCase):
+    class Weird:
+        # not consulted by isinstance, it lives on the class
+        def __instancecheck__(self, value):
+            return False
+
+    class Abstract(ABC):
+        pass
+
+    def test_type(self):
+        for decorate in (
+            typecheck,
+            typecheck(codegen=True),
+        ):
+
+            @decorate
+            def fnc(cls: type):
+                return cls
+
+            with self.subTest(decorate=decorate, msg="ok"):
+                self.assertIs(fnc(int), int)
+            with self.subTest(
+                decorate=decorate, msg="wrong"
+            ):
+                with self.assertRaises(TypeCheckError):
+                    fnc(3)
+
+    def test_subclass(self):
+        for decorate in (
+            typecheck,
+            typecheck(codegen=True),
+        ):
+
+            @decorate
+            def fnc(cls: Type[int]):
+                return cls
+
+            with self.subTest(decorate=decorate, msg="ok"):
+                self.assertIs(fnc(bool), bool)
+            with self.subTest(
+                decorate=decorate, msg="wrong"
+            ):
+                with self.assertRaises(TypeCheckError):
+                    fnc(str)
+                with self.assertRaises(TypeCheckError):
+                    fnc(3)
+
+    def test_abc(self):
+        class Impl(self.Abstract):
+            pass
+
+        @typecheck
+        def fnc(a: self.Abstract):
+            return a
+
+        with self.subTest("ok"):
+            self.assertIsInstance(fnc(Impl()), Impl)
+        with self.subTest("wrong"):
+            with self.assertRaises(TypeCheckError):
+                fnc(3)
+
+    def test_class_defines_instancecheck(self):
+        @typecheck
+        def fnc(a: self.Weird):
+            return a
+
+        with self.subTest("ok"):
+            self.assertIsNotNone(fnc(self.Weird()))
+        with self.subTest("wrong"):
+            with self.assertRaises(TypeCheckError):
+                fnc(3)
+
+    def test_none(self):
+        for decorate in (
+            typecheck,
+            typecheck(codegen=True),
+        ):
+
+            @decorate
+            def fnc(a: None, *args: None, b: None = None):
+                return a
+
+            with self.subTest(decorate=decorate, msg="ok"):
+                self.assertIsNone(fnc(None, None, b=None))
+            with self.subTest(
+                decorate=decorate, msg="wrong"
+            ):
+                with self.assertRaises(TypeCheckError):
+                    fnc(1)
+                with self.assertRaises(TypeCheckError):
+                    fnc(None, 1)
+                with self.assertRaises(TypeCheckError):
+                    fnc(None, b=1)
+
+
+class test_typecheck_codegen(unittest.TestCase):
+    def test_signature(self):
+        def fnc(
+            a: int,
+            b,
+            /,
+            c: str = "c",
+            *args: int,
+            d,
+            **kw: float,
+        ):
+            return a, b, c, args, d, kw
+
+        wrapped = typecheck(codegen=True)(fnc)
+        with self.subTest("signature"):
+            self.assertEqual(
+                signature(wrapped), signature(fnc)
+            )
+        with self.subTest("call"):
+            self.assertEqual(
+                wrapped(1, 2, "3", 4, d=5, e=6.0),
+                (1, 2, "3", (4,), 5, {"e": 6.0}),
+            )
+        with self.subTest("defaults"):
+            self.assertEqual(
+                wrapped(1, 2, d=5), (1, 2, "c", (), 5, {})
+            )
+
+    def test_kwonly(self):
+        @typecheck(codegen=True)
+        def fnc(a: int, *, b: float, c: str = None):
+            return a, b, c
+
+        with self.subTest("ok"):
+            self.assertEqual(fnc(1, b=2.0), (1, 2.0, None))
+        with self.subTest("wrong type"):
+            with self.assertRaises(TypeCheckError):
+                fnc(1, b=2.0, c=3)
+
+    def test_explicit_default(self):
+        def fnc(x: int, y: str = None, *, z: str = None):
+            return x, y, z
+
+        for decorate in (
+            typecheck,
+            typecheck(codegen=True),
+        ):
+            wrapped = decorate(fnc)
+            with self.subTest(
+                decorate=decorate, msg="left out"
+            ):
+                self.assertEqual(
+                    wrapped(1), (1, None, None)
+                )
+            for args, kwargs in [
+                ((1, None), {}),
+                ((1,), {"y": None}),
+                ((1,), {"z": None}),
+            ]:
+                with self.subTest(
+                    decorate=decorate,
+                    args=args,
+                    kwargs=kwargs,
+                ):
+                    with self.assertRaises(TypeCheckError):
+                        wrapped(*args, **kwargs)
+
+    def test_wrong_types(self):
+        @typecheck(codegen=True)
+        def fnc(
+            a: int,
+            b: Optional[str] = None,
+            *args: int,
+            **kw: int,
+        ):
+            pass
+
+        for args, kwargs in [
+            (("1",), {}),
+            ((), {"a": "1"}),
+            ((1, 2), {}),
+            ((1, None, "3"), {}),
+            ((1,), {"c": "3"}),
+        ]:
+            with self.subTest(args=args, kwargs=kwargs):
+                with self.assertRaises(TypeCheckError):
+                    fnc(*args, **kwargs)
+
+    def test_missing_args(self):
+        @typecheck(codegen=True)
+        def fnc(a: int):
+            pass
+
+        # CPython's own binding error
+        with self.assertRaises(TypeError):
+            fnc()
+
+    def test_hints_in_params(self):
+        @typecheck(codegen=True)
+        def fnc(isinstance: int, wrapper: List[int]):
+            return isinstance, wrapper
+
+        self.assertEqual(fnc(1, [2]), (1, [2]))
+
+
+class test_get_type_checker(unittest.TestCase):
+    CASES = [
+        (int, [1, True], ["1", None]),
+        (Any, [1, None], []),
+        (None, [None], [0]),
+        (Optional[int], [1, None], ["1"]),
+        (Union[int, str], [1, "1"], [1.0]),
+        (int | None, [1, None], ["1"]),
+        (Union[List[int], str], [[1], "1"], [["1"]]),
+        (List[int], [[], [1, 2]], [[1, "2"], (1,)]),
+        (list[int], [[1]], [["1"]]),
+        (Sequence[str], [["a"], ("a",), "a"], [[1]]),
+        (Dict[str, int], [{"a": 1}], [{1: 1}, {"a": "1"}]),
+        (
+            dict[str, List[int]],
+            [{"a": [1]}],
+            [{"a": ["1"]}],
+        ),
+        (
+            Tuple[int, str],
+            [(1, "a")],
+            [(1,), (1, 2), [1, "a"]],
+        ),
+        (Tuple[int, ...], [(), (1, 2)], [(1, "2")]),
+        (tuple[()], [()], [(1,)]),
+        (Tuple, [(), (1, "a")], [[1]]),
+        (List, [[], [1]], [(1,)]),
+        (List[Any], [[1]], [(1,)]),
+        (Dict[Any, Any], [{1: 1}], [[1]]),
+        (
+            Counter[str],
+            [Counter("ab")],
+            [Counter([1]), {}],
+        ),
+        (
+            collections.Counter[str],
+            [Counter("ab")],
+            [Counter([1])],
+        ),
+        (Type[int], [int, bool], [1, str]),
+        (Type[Union[int, str]], [bool, str], [float]),
+        (Type[Any], [int, str], [1]),
+        (Literal["a", 1], ["a", 1], ["b", True]),
+        (Callable[[int], str], [len], [1]),
+    ]
+
+    def test_checkers(self):
+        for hint, good, bad in self.CASES:
+            check = get_type_checker(hint)
+            for value in good:
+                with self.subTest(hint=hint, value=value):
+                    self.assertTrue(check(value))
+            for value in bad:
+                with self.subTest(hint=hint, value=value):
+                    self.assertFalse(check(value))
+
+    def test_cached(self):
+        self.assertIs(
+            get_type_checker(Dict[str, int]),
+            get_type_checker(Dict[str, int]),
+        )
+
+    def test_unsupported_warns_once(self):
+        T = TypeVar("T")
+        with warnings.catch_warnings(
+            record=True
+        ) as caught:
+            warnings.simplefilter("always")
+
+            @typecheck
+            def fnc(a: T, *args: T):
+                pass
+
+            get_type_checker(T)
+            fnc(1, 2)
+            fnc(2, 3)
+        with self.subTest("warned once"):
+            self.assertEqual(len(caught), 1)
+        with self.subTest("ignored"):
+            self.assertIsNone(fnc("1"))
+
+
+class test_containers(unittest.TestCase):
+    BAD_TAIL = [1] * 5000 + ["1"]
+
+    def setUp(self):
+        # a fresh class per test, so no cached checker (or its
+        # memo) is shared, that counts the items it's asked about
+        checked = self.checked = []
+
+        class Meta(type):
+            def __instancecheck__(cls, value):
+                checked.append(value)
+                return True
+
+        class Base(metaclass=Meta):
+            pass
+
+        self.Base = Base
+
+    def test_full(self):
+        check = get_type_checker(List[int])
+        self.assertFalse(check(self.BAD_TAIL))
+
+    def test_first(self):
+        check = get_type_checker(
+            List[int], Containers(first=10)
+        )
+        with self.subTest("bad item after n"):
+            self.assertTrue(check(self.BAD_TAIL))
+        with self.subTest("bad item within n"):
+            self.assertFalse(check(["1"] + self.BAD_TAIL))
+
+    def test_sample(self):
+        check = get_type_checker(
+            Dict[str, List[int]], Containers(sample=3)
+        )
+        with self.subTest("small"):
+            self.assertFalse(check({"a": [1, "2"]}))
+        with self.subTest("all bad"):
+            self.assertFalse(check({"a": ["1"] * 100}))
+        with self.subTest("good"):
+            self.assertTrue(check({"a": [1] * 5000}))
+
+    def test_seconds(self):
+        check = get_type_checker(
+            List[int], Containers(seconds=0)
+        )
+        self.assertTrue(check(self.BAD_TAIL))
+
+    def test_one_strategy(self):
+        with self.assertRaises(ValueError):
+            Containers(first=1, sample=1)
+
+    def test_negative(self):
+        for kwargs in (
+            {"first": -1},
+            {"sample": -1},
+            {"seconds": -0.1},
+        ):
+            with self.subTest(**kwargs):
+                with self.assertRaises(ValueError):
+                    Containers(**kwargs)
+
+    def test_decorator(self):
+        @typecheck(containers=Containers(first=1))
+        def fnc(a: List[int]):
+            return len(a)
+
+        @typecheck(
+            codegen=True, containers=Containers(first=1)
+        )
+        def gen(a: List[int]):
+            return len(a)
+
+        for wrapped in (fnc, gen):
+            with self.subTest(wrapped=wrapped):
+                self.assertEqual(
+                    wrapped(self.BAD_TAIL), 5001
+                )
+
+    def test_memo(self):
+        check = get_type_checker(
+            Tuple[self.Base, ...], Containers(memo=True)
+        )
+        value = tuple(range(10))
+        with self.subTest("first call"):
+            self.assertTrue(check(value))
+            self.assertEqual(len(self.checked), 10)
+        with self.subTest("same tuple"):
+            self.assertTrue(check(value))
+            self.assertEqual(len(self.checked), 10)
+        with self.subTest("equal tuple"):
+            self.assertTrue(check(tuple(range(10))))
+            self.assertEqual(len(self.checked), 20)
+
+    def test_memo_off_by_default(self):
+        check = get_type_checker(Tuple[self.Base, ...])
+        value = tuple(range(10))
+        self.assertTrue(check(value))
+        self.assertTrue(check(value))
+        self.assertEqual(len(self.checked), 20)
+
+    def test_memo_bounded_by_items(self):
+        check = get_type_checker(
+            Tuple[self.Base, ...], Containers(memo=True)
+        )
+        first, second = tuple(range(6)), tuple(range(6))
+        with patch("typecheck.typecheck.MEMO_ITEMS", 10):
+            for value in (first, second, first, second):
+                self.assertTrue(check(value))
+        # 12 items don't fit in 10, each evicts the other
+        self.assertEqual(len(self.checked), 24)
+
+    def test_no_memo_for_mutable(self):
+        check = get_type_checker(
+            Tuple[List[int], ...], Containers(memo=True)
+        )
+        value = ([1],)
+        self.assertTrue(check(value))
+        value[0].append("2")
+        self.assertFalse(check(value))
+
 
 # implementation tests below
 # =========================================================
@@ -1,28 +1,63 @@
+import collections.abc
+import random
+import types
 from dataclasses import dataclass, field
-from functools import lru_cache, wraps
-from inspect import getfullargspec, FullArgSpec
+from functools import lru_cache, partial, wraps
+from inspect import (
+    getfullargspec,
+    signature,
+    FullArgSpec,
+    Parameter,
+)
+from itertools import islice
+from time import perf_counter
 from typing import (
+    Annotated,
     Any,
     Callable,
+    Literal,
     Optional,
-    TypeVar,
+    Tuple,
     Union,
-    _GenericAlias,
+    get_args,
+    get_origin,
 )
 from warnings import warn
 
 
-__all__ = ["typecheck"]
+__all__ = ["typecheck", "Containers"]
+
+# X | Y, python 3.10+
+UnionType = getattr(types, "UnionType", Union)
+
+# how many items, summed over the validated tuples/frozensets
+# it holds on to, each memoizing checker may keep alive
+MEMO_ITEMS = 100_000
+
+# the generated wrappers' default for checked parameters, so
+# passing the default object itself still gets checked
+_MISSING = object()
+
+
+def typecheck(
+    callable=None, *, codegen=False, containers=None
+):
+    if callable is None:
+        return partial(
+            typecheck,
+            codegen=codegen,
+            containers=containers,
+        )
+    containers = containers or FULL
+    if codegen:
+        wrapper = generate_wrapper(callable, containers)
+        return wraps(callable)(wrapper)
 
+    check = compile_plan(callable, containers)
 
-def typecheck(callable):
     @wraps(callable)
     def decorator(*args, **kwargs):
-        values = parse_inputs(
-            fnc=callable, args=args, kwargs=kwargs
-        )
-        typehints = get_fnc_annotations(callable)
-        check_types(values, typehints)
+        check(args, kwargs)
         return callable(*args, **kwargs)
 
     return decorator
@@ -67,6 +102,40 @@ class TypeCheckError(TypeError):
     pass
 
 
+@dataclass(frozen=True)
+class Containers:
+    # how much of a container's contents gets checked: all of
+    # it (the default), the `first` n items, a random `sample`
+    # of k items (first k for non-sequences) or as many as fit
+    # in `seconds`. With `memo`, tuples / frozensets of plain
+    # classes that passed once are remembered by id() and not
+    # checked again
+    first: Optional[int] = None
+    sample: Optional[int] = None
+    seconds: Optional[float] = None
+    memo: bool = False
+
+    def __post_init__(self):
+        given = [
+            opt
+            for opt in (
+                self.first,
+                self.sample,
+                self.seconds,
+            )
+            if opt is not None
+        ]
+        if len(given) > 1:
+            msg = "Pick one of first, sample or seconds"
+            raise ValueError(msg)
+        if any(opt < 0 for opt in given):
+            msg = "first, sample and seconds can't be negative"
+            raise ValueError(msg)
+
+
+FULL = Containers()
+
+
 # ---------------------------------------------------------
 def check_types(values: Input, typehints: dict) -> None:
     if not typehints:
@@ -118,35 +187,7 @@ def check_params(values: dict, typehints: dict) -> None:
 
 
 def _check_params(value: Any, typehint) -> bool:
-    if isinstance(typehint, _GenericAlias):
-        if typehint.__dict__["__origin__"] == Union:
-            typehint = typehint.__dict__["__args__"]
-
-        elif typehint.__dict__["__origin__"] == list:
-            inner = typehint.__dict__["__args__"][0]
-            if isinstance(inner, TypeVar):
-                msg = f"Type check for {typehint} is not yet supported, ignoring"
-                warn(msg)
-                return True
-            else:
-                typehint = inner
-                for arg in value:
-                    res = isinstance(arg, typehint)
-                    if not res:
-                        return res
-                return True
-
-        else:
-            msg = f"Type check for {typehint} is not yet supported, ignoring"
-            warn(msg)
-            return True
-
-    elif not isinstance(typehint, type):
-        msg = f"Type check for {typehint} is not yet supported, ignoring"
-        warn(msg)
-        return True
-
-    return isinstance(value, typehint)
+    return get_type_checker(typehint)(value)
 
 
 def check_args(values: tuple, typehint) -> None:
@@ -184,6 +225,508 @@ def check_kwargs(values: dict, typehint) -> None:
     return
 
 
+# ---------------------------------------------------------
+def compile_plan(
+    fnc: Callable, containers: Containers = FULL
+) -> Callable[[tuple, dict], None]:
+    # the spec and hints worked out once, when decorating: which
+    # positional slot / keyword gets which checker. A call is
+    # then a loop over the arguments, no Input to build.
+    # Defaults aren't checked, only what the caller passed
+    spec = get_fnc_spec(fnc)
+    hints = spec.annotations
+    names = spec.args
+    n_names = len(names)
+    n_required = n_names - len(spec.defaults or ())
+    slots = [
+        (i, name, _plan_checker(hints, name, containers))
+        for i, name in enumerate(names)
+        if name in hints
+    ]
+    positional = frozenset(names)
+    varargs = spec.varargs
+    varargs_check = _plan_checker(
+        hints, varargs, containers
+    )
+    kwonly = {
+        name: _plan_checker(hints, name, containers)
+        for name in spec.kwonlyargs
+    }
+    kwonly_required = frozenset(spec.kwonlyargs) - set(
+        spec.kwonlydefaults or ()
+    )
+    varkw = spec.varkw
+    varkw_check = _plan_checker(hints, varkw, containers)
+
+    def positional_error(args):
+        msg = f"Callable takes positional argument(s) {names}, but was given {args}"
+        return TypeCheckError(msg)
+
+    def keyword_error(kwargs):
+        msg = f"Callable takes keyword argument(s) {spec.kwonlyargs}, but was given {kwargs}"
+        return TypeCheckError(msg)
+
+    def param_error(name, value):
+        return _param_error(name, hints[name], value)
+
+    def check(args, kwargs):
+        n_args = len(args)
+        if n_args > n_names and varargs is None:
+            raise positional_error(args)
+        if n_args < n_required:
+            for name in names[n_args:n_required]:
+                if name not in kwargs:
+                    raise positional_error(args)
+
+        for i, name, checker in slots:
+            if i < n_args:
+                value = args[i]
+            elif name in kwargs:
+                value = kwargs[name]
+            else:
+                continue
+            if not checker(value):
+                raise param_error(name, value)
+
+        if varargs_check and n_args > n_names:
+            for value in islice(args, n_names, None):
+                if not varargs_check(value):
+                    raise _varargs_error(hints[varargs])
+
+        if not kwargs:
+            if kwonly_required:
+                raise keyword_error(kwargs)
+            return
+        for name, value in kwargs.items():
+            if name in kwonly:
+                checker = kwonly[name]
+                if checker and not checker(value):
+                    raise param_error(name, value)
+            elif name in positional:
+                continue
+            elif varkw is None:
+                raise keyword_error(kwargs)
+            elif varkw_check and not varkw_check(value):
+                raise _varkw_error(hints[varkw])
+        if (
+            kwonly_required
+            and not kwonly_required <= kwargs.keys()
+        ):
+            raise keyword_error(kwargs)
+
+    return check
+
+
+def _plan_checker(
+    hints: dict,
+    name: Optional[str],
+    containers: Containers,
+) -> Optional[Callable]:
+    # None for no annotation, a `None` hint is NoneType
+    if name not in hints:
+        return None
+    return get_type_checker(hints[name], containers)
+
+
+# ---------------------------------------------------------
+def get_type_checker(
+    typehint, containers: Containers = FULL
+) -> Callable[[Any], bool]:
+    # one closure per hint, built (and warned about) once
+    try:
+        return _cached_checker(typehint, containers)
+    except TypeError:
+        # unhashable, e.g. Literal[[1]]
+        return _build_checker(typehint, containers)
+
+
+@lru_cache(maxsize=None)
+def _cached_checker(
+    typehint, containers: Containers
+) -> Callable[[Any], bool]:
+    return _build_checker(typehint, containers)
+
+
+def _build_checker(
+    typehint, containers: Containers
+) -> Callable[[Any], bool]:
+    if typehint is Any:
+        return _anything
+    if typehint is None:
+        typehint = type(None)
+
+    origin = get_origin(typehint)
+    args = get_args(typehint)
+    if origin is None:
+        if isinstance(typehint, type):
+            return _instance_checker(typehint)
+        return _unsupported(typehint)
+
+    if origin is Annotated:
+        return get_type_checker(args[0], containers)
+    if origin is Union or origin is UnionType:
+        return _union_checker(args, containers)
+    if origin is Literal:
+        return _literal_checker(args)
+    if origin is collections.abc.Callable:
+        return callable
+    if typehint is Tuple:
+        # bare, get_args gives () here just as for Tuple[()]
+        return _instance_checker(tuple)
+    if origin is tuple:
+        return _tuple_checker(args, containers)
+    if origin is type and args:
+        return _subclass_checker(args[0])
+    if not isinstance(origin, type):
+        return _unsupported(typehint)
+    if (
+        issubclass(origin, collections.abc.Mapping)
+        and args
+    ):
+        # Counter[K] only names the keys
+        key, val = (*args, Any)[:2]
+        return _mapping_checker(
+            origin, key, val, containers
+        )
+    # not Iterables in general, checking an iterator would use
+    # it up
+    if (
+        issubclass(origin, collections.abc.Collection)
+        and args
+    ):
+        return _collection_checker(
+            origin, args[0], containers
+        )
+    return _instance_checker(origin)
+
+
+def _anything(value) -> bool:
+    return True
+
+
+def _instance_checker(cls) -> Callable[[Any], bool]:
+    # isinstance without a python level lambda around it. Bound
+    # from the metaclass the way isinstance looks it up, since
+    # cls.__instancecheck__ is a plain function / unbound
+    # descriptor for `type`, ABCs and classes defining one
+    return type(cls).__instancecheck__.__get__(cls)
+
+
+def _unsupported(typehint) -> Callable[[Any], bool]:
+    msg = f"Type check for {typehint} is not yet supported, ignoring"
+    warn(msg)
+    return _anything
+
+
+def _subclass_checker(arg) -> Callable[[Any], bool]:
+    # Type[X]: X itself or a subclass of it
+    if get_origin(arg) in (Union, UnionType):
+        classes = get_args(arg)
+    else:
+        classes = (arg,)
+    if Any in classes or not all(
+        isinstance(cls, type) for cls in classes
+    ):
+        # Type[Any], Type[T], ...
+        return _instance_checker(type)
+    return lambda value: isinstance(
+        value, type
+    ) and issubclass(value, classes)
+
+
+def _is_class(typehint) -> bool:
+    return (
+        isinstance(typehint, type)
+        and get_origin(typehint) is None
+    )
+
+
+def _union_checker(
+    args, containers: Containers
+) -> Callable[[Any], bool]:
+    if all(map(_is_class, args)):
+        return lambda value: isinstance(value, args)
+    checkers = [
+        get_type_checker(arg, containers) for arg in args
+    ]
+    if _anything in checkers:
+        return _anything
+    return lambda value: any(
+        check(value) for check in checkers
+    )
+
+
+def _literal_checker(args) -> Callable[[Any], bool]:
+    # by type too, so True doesn't pass for Literal[1]
+    return lambda value: any(
+        value == arg and type(value) is type(arg)
+        for arg in args
+    )
+
+
+def _tuple_checker(
+    args, containers: Containers
+) -> Callable[[Any], bool]:
+    if len(args) == 2 and args[1] is Ellipsis:
+        return _collection_checker(
+            tuple, args[0], containers
+        )
+    if args == ((),):
+        # Tuple[()]
+        args = ()
+    # fixed length, always checked in full
+    checkers = [
+        get_type_checker(arg, containers) for arg in args
+    ]
+
+    def check(value):
+        return (
+            isinstance(value, tuple)
+            and len(value) == len(checkers)
+            and all(map(_call, checkers, value))
+        )
+
+    return check
+
+
+def _mapping_checker(
+    origin, key, val, containers: Containers
+) -> Callable[[Any], bool]:
+    check_key = get_type_checker(key, containers)
+    check_val = get_type_checker(val, containers)
+    if check_key is _anything and check_val is _anything:
+        return _instance_checker(origin)
+
+    def check(value):
+        return isinstance(value, origin) and all(
+            check_key(k) and check_val(v)
+            for k, v in _items(value.items(), containers)
+        )
+
+    return check
+
+
+def _collection_checker(
+    origin, arg, containers: Containers
+) -> Callable[[Any], bool]:
+    check_item = get_type_checker(arg, containers)
+    if check_item is _anything:
+        return _instance_checker(origin)
+    if _is_class(arg):
+        check_items = lambda value: all(
+            isinstance(item, arg)
+            for item in _items(value, containers)
+        )
+    else:
+        check_items = lambda value: all(
+            map(check_item, _items(value, containers))
+        )
+
+    if not (containers.memo and _memoizable(origin, arg)):
+        return lambda value: isinstance(
+            value, origin
+        ) and check_items(value)
+
+    # a tuple / frozenset of plain class instances that passed
+    # once passes for good, so remember it by id(), holding on
+    # to it so the id can't be reused. Neither can be weakly
+    # referenced, hence the bound on the items kept alive
+    memo: dict = {}
+    held = 0
+
+    def check(value):
+        nonlocal held
+        if not isinstance(value, origin):
+            return False
+        key = id(value)
+        if memo.get(key) is value:
+            return True
+        if not check_items(value):
+            return False
+        size = len(value)
+        if (
+            type(value) in (tuple, frozenset)
+            and size <= MEMO_ITEMS
+        ):
+            if held + size > MEMO_ITEMS:
+                memo.clear()
+                held = 0
+            memo[key] = value
+            held += size
+        return True
+
+    return check
+
+
+def _memoizable(origin, arg) -> bool:
+    immutable = issubclass(tuple, origin) or issubclass(
+        frozenset, origin
+    )
+    # X or a Union of plain classes, anything deeper could be
+    # mutable (Tuple[List[int], ...])
+    members = (
+        get_args(arg)
+        if get_origin(arg) in (Union, UnionType)
+        else (arg,)
+    )
+    return immutable and all(map(_is_class, members))
+
+
+def _items(values, containers: Containers):
+    if containers.first is not None:
+        return islice(values, containers.first)
+    if containers.sample is not None:
+        return _sample(values, containers.sample)
+    if containers.seconds is not None:
+        return _timed(values, containers.seconds)
+    return values
+
+
+def _sample(values, k):
+    if len(values) <= k:
+        return values
+    if not isinstance(values, collections.abc.Sequence):
+        return islice(values, k)
+    indices = random.sample(range(len(values)), k)
+    return (values[i] for i in indices)
+
+
+def _timed(values, seconds):
+    # the clock is only read every 1024 items
+    stop = perf_counter() + seconds
+    for i, value in enumerate(values):
+        if i and not i & 1023 and perf_counter() > stop:
+            return
+        yield value
+
+
+def _call(check, value) -> bool:
+    return check(value)
+
+
+# ---------------------------------------------------------
+def generate_wrapper(
+    fnc: Callable, containers: Containers = FULL
+) -> Callable:
+    # exec's a wrapper with fnc's own signature and the checks
+    # inlined, so CPython does the argument binding (and raises
+    # its own TypeError for missing / unexpected arguments)
+    hints = get_fnc_annotations(fnc)
+    namespace = {
+        "__tc_fnc": fnc,
+        "__tc_isinstance": isinstance,
+        "__tc_param_error": _param_error,
+        "__tc_varargs_error": _varargs_error,
+        "__tc_varkw_error": _varkw_error,
+        "__tc_missing": _MISSING,
+    }
+    params, checks, fill, call = [], [], [], []
+    kinds = [
+        p.kind for p in signature(fnc).parameters.values()
+    ]
+    for param in signature(fnc).parameters.values():
+        name, kind = param.name, param.kind
+        default = f"__tc_default_{name}"
+        if kind is Parameter.VAR_POSITIONAL:
+            params.append(f"*{name}")
+            call.append(f"*{name}")
+        elif kind is Parameter.VAR_KEYWORD:
+            params.append(f"**{name}")
+            call.append(f"**{name}")
+        else:
+            if (
+                kind is Parameter.KEYWORD_ONLY
+                and Parameter.VAR_POSITIONAL not in kinds
+                and "*" not in params
+            ):
+                params.append("*")
+            if param.default is param.empty:
+                params.append(name)
+            elif name in hints:
+                namespace[default] = param.default
+                params.append(f"{name}=__tc_missing")
+                fill += [
+                    f"if {name} is __tc_missing:",
+                    f"    {name} = {default}",
+                ]
+            else:
+                namespace[default] = param.default
+                params.append(f"{name}={default}")
+            if kind is Parameter.KEYWORD_ONLY:
+                call.append(f"{name}={name}")
+            else:
+                call.append(name)
+            if (
+                kind is Parameter.POSITIONAL_ONLY
+                and kinds.count(Parameter.POSITIONAL_ONLY)
+                == len(params)
+            ):
+                params.append("/")
+
+        if name not in hints:
+            continue
+        hint = hints[name]
+        checker = _plan_checker(hints, name, containers)
+        namespace[f"__tc_hint_{name}"] = hint
+        if _is_class(hint):
+            namespace[f"__tc_type_{name}"] = hint
+            test = (
+                f"__tc_isinstance({{}}, __tc_type_{name})"
+            )
+        else:
+            namespace[f"__tc_check_{name}"] = checker
+            test = f"__tc_check_{name}({{}})"
+
+        if kind is Parameter.VAR_POSITIONAL:
+            checks += [
+                f"for __tc_value in {name}:",
+                f"    if not {test.format('__tc_value')}:",
+                f"        raise __tc_varargs_error(__tc_hint_{name})",
+            ]
+        elif kind is Parameter.VAR_KEYWORD:
+            checks += [
+                f"for __tc_value in {name}.values():",
+                f"    if not {test.format('__tc_value')}:",
+                f"        raise __tc_varkw_error(__tc_hint_{name})",
+            ]
+        else:
+            cond = f"not {test.format(name)}"
+            if param.default is not param.empty:
+                # defaults aren't checked, same as compile_plan
+                cond = f"{name} is not __tc_missing and {cond}"
+
+            checks += [
+                f"if {cond}:",
+                f"    raise __tc_param_error({name!r}, __tc_hint_{name}, {name})",
+            ]
+
+    body = [
+        *checks,
+        *fill,
+        f"return __tc_fnc({', '.join(call)})",
+    ]
+    source = "\n    ".join(
+        [f"def wrapper({', '.join(params)}):", *body]
+    )
+    exec(source, namespace)
+    return namespace["wrapper"]
+
+
+def _param_error(name, typehint, value) -> TypeCheckError:
+    msg = f"Param {name} expected {typehint} but received {type(value)}"
+    return TypeCheckError(msg)
+
+
+def _varargs_error(typehint) -> TypeCheckError:
+    msg = f"varargs must all be of type {typehint}"
+    return TypeCheckError(msg)
+
+
+def _varkw_error(typehint) -> TypeCheckError:
+    msg = f"varkw must all be of type {typehint}"
+    return TypeCheckError(msg)
+
+
 # ---------------------------------------------------------
 def parse_inputs(
     fnc: Callable,
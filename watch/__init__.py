@@ -1 +1,6 @@
-from watch.watch import Watch
+from watch.watch import (
+    Changes,
+    Debounce,
+    InotifyWatch,
+    Watch,
+)
@@ -1,7 +1,25 @@
-from watch import Watch
+from watch import Changes, Debounce, InotifyWatch, Watch
+from watch.watch import (
+    DirCache,
+    Ignore,
+    all_files,
+    diff,
+    load_files,
+    modified_files,
+    save_files,
+    SNAPSHOT_HEADER,
+    INOTIFY_EVENT,
+    IN_Q_OVERFLOW,
+)
 
-from unittest import TestCase
-from unittest.mock import patch
+import asyncio
+import os
+import sys
+from fnmatch import fnmatchcase
+from tempfile import TemporaryDirectory
+from time import sleep, time
+from unittest import TestCase, skipUnless
+from unittest.mock import ANY, patch
 
 
 @patch("watch.watch.all_files")
@@ -47,3 +65,756 @@ class TestWatch(TestCase):
         watch.ack()
         with self.subTest(msg="after ack"):
             self.assertEqual(watch.removed, [])
+
+    def test_changes(self, mock_all_files):
+        mock_all_files.side_effect = [
+            {"foo.txt": 1},
+            {"foo.txt": 1},
+            {"foo.txt": 2},
+            {"foo.txt": 2, "bar.txt": 1},
+        ]
+        watch = Watch()
+
+        async def run():
+            batches = []
+            async for changes in watch.changes(interval=0):
+                batches.append(changes)
+                if len(batches) == 2:
+                    break
+            return batches
+
+        self.assertEqual(
+            asyncio.run(run()),
+            [
+                Changes(
+                    created={},
+                    modified={"foo.txt": 2},
+                    removed={},
+                ),
+                Changes(
+                    created={"bar.txt": 1},
+                    modified={},
+                    removed={},
+                ),
+            ],
+        )
+
+    def test_changes_off_loop(self, mock_all_files):
+        def slow_walk(*args):
+            sleep(0.2)
+            return {"foo.txt": 1}
+
+        mock_all_files.return_value = {}
+        watch = Watch()
+        mock_all_files.side_effect = slow_walk
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        async def run():
+            ticker = asyncio.create_task(tick())
+            async for changes in watch.changes():
+                ticker.cancel()
+                return changes
+
+        with self.subTest(msg="changes"):
+            self.assertEqual(
+                asyncio.run(run()).created, {"foo.txt": 1}
+            )
+        with self.subTest(msg="loop kept running"):
+            self.assertGreater(ticks, 5)
+
+    def test_modified_and_removed(self, mock_all_files):
+        mock_all_files.return_value = {
+            "foo.txt": 1,
+            "bar.txt": 1,
+        }
+        watch = Watch()
+
+        mock_all_files.return_value = {"foo.txt": 2}
+        self.assertEqual(watch.modified, ["foo.txt"])
+
+    def test_poll(self, mock_all_files):
+        mock_all_files.return_value = {
+            "foo.txt": 1,
+            "bar.txt": 1,
+        }
+        watch = Watch()
+
+        mock_all_files.return_value = {
+            "foo.txt": 2,
+            "baz.txt": 1,
+        }
+        expect = Changes(
+            created={"baz.txt": 1},
+            modified={"foo.txt": 2},
+            removed={"bar.txt": 1},
+        )
+        with self.subTest(msg="changes"):
+            self.assertEqual(watch.poll(), expect)
+        with self.subTest(msg="single walk"):
+            self.assertEqual(mock_all_files.call_count, 2)
+
+        # whatever happens after the poll isn't acked
+        mock_all_files.return_value = {"foo.txt": 3}
+        watch.ack()
+        with self.subTest(msg="after ack"):
+            self.assertEqual(
+                sorted(watch.files), ["baz.txt", "foo.txt"]
+            )
+        with self.subTest(msg="later change"):
+            self.assertEqual(
+                watch.poll().modified, {"foo.txt": 3}
+            )
+
+
+@patch("watch.watch.all_files")
+class TestDebounce(TestCase):
+    def setUp(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def debounce(self, mock_all_files, files):
+        mock_all_files.return_value = files
+        return Debounce(
+            Watch(),
+            quiet=1,
+            max_latency=5,
+            clock=self.clock,
+        )
+
+    def step(
+        self, debounce, mock_all_files, files, dt=0.5
+    ):
+        self.now += dt
+        mock_all_files.return_value = files
+        return debounce.poll()
+
+    def test_quiet_window(self, mock_all_files):
+        debounce = self.debounce(mock_all_files, {"a": 1})
+        step = lambda files: self.step(
+            debounce, mock_all_files, files
+        )
+        with self.subTest(msg="nothing"):
+            self.assertIsNone(step({"a": 1}))
+        with self.subTest(msg="still busy"):
+            self.assertIsNone(step({"a": 1, "b": 1}))
+            self.assertIsNone(step({"a": 1, "b": 2}))
+            self.assertIsNone(step({"b": 2}))
+            self.assertIsNone(step({"b": 2}))
+        with self.subTest(msg="quiet"):
+            self.assertEqual(
+                step({"b": 2}),
+                Changes(
+                    created={"b": 2},
+                    modified={},
+                    removed={"a": 1},
+                ),
+            )
+        with self.subTest(msg="sent"):
+            self.assertIsNone(step({"b": 2}))
+
+    def test_cancelled_out(self, mock_all_files):
+        debounce = self.debounce(mock_all_files, {})
+        step = lambda files: self.step(
+            debounce, mock_all_files, files
+        )
+        self.assertIsNone(step({"tmp": 1}))
+        self.assertIsNone(step({}))
+        self.assertIsNone(step({}))
+        self.assertIsNone(step({}))
+
+    def test_removed_then_created(self, mock_all_files):
+        debounce = self.debounce(mock_all_files, {"a": 1})
+        step = lambda files: self.step(
+            debounce, mock_all_files, files
+        )
+        step({})
+        step({"a": 2})
+        step({"a": 2})
+        self.assertEqual(
+            step({"a": 2}),
+            Changes(
+                created={}, modified={"a": 2}, removed={}
+            ),
+        )
+
+    def test_max_latency(self, mock_all_files):
+        debounce = self.debounce(mock_all_files, {"a": 0})
+        batch = None
+        for ts in range(1, 20):
+            batch = self.step(
+                debounce, mock_all_files, {"a": ts}
+            )
+            if batch:
+                break
+        with self.subTest(msg="after max_latency"):
+            self.assertEqual(self.now, 5.5)
+        with self.subTest(msg="latest mtime"):
+            self.assertEqual(batch.modified, {"a": 11})
+
+
+class TestContent(TestCase):
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+        self.path = os.path.join(self.root, "a.txt")
+        self.write("hello")
+        self.watch = Watch(self.root, content=True)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write(self, text, ns=10**9):
+        with open(self.path, "w") as handler:
+            handler.write(text)
+        os.utime(self.path, ns=(ns, ns))
+
+    def test_touched(self):
+        os.utime(self.path, ns=(2 * 10**9, 2 * 10**9))
+        with self.subTest(msg="not modified"):
+            self.assertEqual(
+                self.watch.poll().modified, {}
+            )
+
+        with patch("watch.watch._digest") as mock_digest:
+            self.watch.poll()
+        with self.subTest(msg="not read again"):
+            mock_digest.assert_not_called()
+
+    def test_same_bytes(self):
+        self.write("hello", ns=2 * 10**9)
+        self.assertEqual(self.watch.modified, [])
+
+    def test_modified(self):
+        for msg, text in [
+            ("same size", "jello"),
+            ("size", "hi"),
+        ]:
+            self.write(text, ns=len(text) * 10**9)
+            with self.subTest(msg=msg):
+                self.assertEqual(
+                    list(self.watch.poll().modified),
+                    [self.path],
+                )
+            self.watch.ack()
+
+    def test_created_then_touched(self):
+        path = os.path.join(self.root, "b.txt")
+        with open(path, "w") as handler:
+            handler.write("new")
+        self.watch.poll()
+        self.watch.ack()
+
+        os.utime(path, ns=(3 * 10**9, 3 * 10**9))
+        self.assertEqual(self.watch.poll().modified, {})
+
+    def test_edited_while_down(self):
+        with TemporaryDirectory() as tmp:
+            snapshot = os.path.join(tmp, "snap")
+            watch = Watch(
+                self.root, snapshot=snapshot, content=True
+            )
+            watch.save()
+
+            self.write("jello", ns=2 * 10**9)
+            watch = Watch(
+                self.root, snapshot=snapshot, content=True
+            )
+            self.assertEqual(
+                list(watch.poll().modified), [self.path]
+            )
+
+
+class TestSnapshot(TestCase):
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "snap")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_roundtrip(self):
+        files = {
+            "/b/\u00e9.txt": 2,
+            "/a.txt": 10**18,
+            "/c": -1,
+        }
+        save_files(files, self.path)
+        self.assertEqual(load_files(self.path), files)
+
+    def test_empty(self):
+        save_files({}, self.path)
+        self.assertEqual(load_files(self.path), {})
+
+    def test_not_a_snapshot(self):
+        with open(self.path, "wb") as handler:
+            handler.write(b"nope")
+        with self.assertRaises(ValueError):
+            load_files(self.path)
+
+    def test_truncated(self):
+        save_files({"/a.txt": 1, "/b.txt": 2}, self.path)
+        with open(self.path, "rb") as handler:
+            data = handler.read()
+        for msg, size in [
+            ("mtimes", SNAPSHOT_HEADER.size + 8),
+            ("paths", len(data) - len("/b.txt") - 1),
+        ]:
+            with open(self.path, "wb") as handler:
+                handler.write(data[:size])
+            with self.subTest(msg=msg):
+                with self.assertRaises(ValueError):
+                    load_files(self.path)
+
+    @patch("watch.watch.all_files")
+    def test_save_without_path(self, mock_all_files):
+        mock_all_files.return_value = {}
+        cwd = os.getcwd()
+        os.chdir(self._tmp.name)
+        try:
+            with self.assertRaises(ValueError):
+                Watch().save()
+            self.assertEqual(os.listdir("."), [])
+        finally:
+            os.chdir(cwd)
+
+    @patch("watch.watch.all_files")
+    def test_restart(self, mock_all_files):
+        mock_all_files.return_value = {
+            "foo.txt": 1,
+            "bar.txt": 1,
+        }
+        watch = Watch(snapshot=self.path)
+        with self.subTest(msg="no snapshot yet"):
+            mock_all_files.assert_called_once()
+
+        mock_all_files.return_value = {"foo.txt": 1}
+        watch.poll()
+        watch.ack()
+        watch.save()
+
+        # changed while we were down
+        mock_all_files.reset_mock()
+        mock_all_files.return_value = {
+            "foo.txt": 2,
+            "baz.txt": 1,
+        }
+        watch = Watch(snapshot=self.path)
+        with self.subTest(msg="loaded, not walked"):
+            mock_all_files.assert_not_called()
+        with self.subTest(msg="changes since"):
+            self.assertEqual(
+                watch.poll(),
+                Changes(
+                    created={"baz.txt": 1},
+                    modified={"foo.txt": 2},
+                    removed={},
+                ),
+            )
+
+
+class TestAllFiles(TestCase):
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+        os.makedirs(self.join("sub", "skip"))
+        for name in (
+            "a.txt",
+            "a.log",
+            "sub/b.txt",
+            "sub/skip/c.txt",
+        ):
+            open(self.join(name), "w").close()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def join(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_ignored(self):
+        actual = all_files(
+            self.root,
+            ignore_dirs=("skip",),
+            ignore_files=("*.log",),
+        )
+        expect = [
+            self.join("a.txt"),
+            self.join("sub", "b.txt"),
+        ]
+        self.assertEqual(sorted(actual), sorted(expect))
+
+    def test_path_pattern(self):
+        actual = all_files(
+            self.root, ignore_files=("sub/**/*.txt",)
+        )
+        self.assertEqual(
+            sorted(actual),
+            [self.join("a.log"), self.join("a.txt")],
+        )
+
+    def test_relative_path(self):
+        cwd = os.getcwd()
+        os.chdir(self.join("sub"))
+        try:
+            actual = all_files("skip")
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(
+            list(actual),
+            [self.join("sub", "skip", "c.txt")],
+        )
+
+    def test_sub_second_mtime(self):
+        path = self.join("a.txt")
+        os.utime(path, ns=(10**9, 10**9))
+        before = all_files(self.root)[path]
+        os.utime(path, ns=(10**9 + 1, 10**9 + 1))
+        self.assertNotEqual(
+            all_files(self.root)[path], before
+        )
+
+    def test_workers(self):
+        for n in range(5):
+            os.makedirs(self.join("wide", str(n), "deep"))
+            open(
+                self.join("wide", str(n), "f.txt"), "w"
+            ).close()
+            open(
+                self.join("wide", str(n), "deep", "g.txt"),
+                "w",
+            ).close()
+        expect = all_files(
+            self.root, ignore_dirs=("skip",)
+        )
+        actual = all_files(
+            self.root, ignore_dirs=("skip",), workers=3
+        )
+        with self.subTest(msg="same files"):
+            self.assertEqual(actual, expect)
+        with self.subTest(msg="whole tree"):
+            self.assertEqual(len(actual), 13)
+
+    def test_dangling_link(self):
+        os.symlink(self.join("nope"), self.join("link"))
+        self.assertNotIn(
+            self.join("link"), all_files(self.root)
+        )
+
+
+class TestDiff(TestCase):
+    TRACKER = {"same": 1, "mod": 1, "gone": 1}
+    CURRENT = {"same": 1, "mod": 2, "new": 1}
+
+    def test_modified_files_removed(self):
+        self.assertEqual(
+            modified_files(self.TRACKER, self.CURRENT),
+            {"mod": 2},
+        )
+
+    def test_diff(self):
+        self.assertEqual(
+            diff(self.TRACKER, self.CURRENT),
+            Changes(
+                created={"new": 1},
+                modified={"mod": 2},
+                removed={"gone": 1},
+            ),
+        )
+
+    def test_empty(self):
+        empty = Changes({}, {}, {})
+        with self.subTest(msg="nothing tracked"):
+            self.assertEqual(diff({}, {}), empty)
+        with self.subTest(msg="no changes"):
+            self.assertEqual(
+                diff(self.TRACKER, dict(self.TRACKER)),
+                empty,
+            )
+
+
+class TestIgnore(TestCase):
+    def assertIgnored(self, ignore, rel, expect=True):
+        path = os.path.join(os.sep, "r", *rel.split("/"))
+        name = os.path.basename(path)
+        self.assertEqual(ignore(name, path), expect, rel)
+
+    def test_names(self):
+        ignore = Ignore(["node_modules", "*.py[co]"], "/r")
+        for rel, expect in [
+            ("node_modules", True),
+            ("a/b/node_modules", True),
+            ("node_modules2", False),
+            ("a/x.pyc", True),
+            ("x.pyo", True),
+            ("x.py", False),
+        ]:
+            with self.subTest(rel=rel):
+                self.assertIgnored(ignore, rel, expect)
+
+    def test_paths(self):
+        ignore = Ignore(
+            ["build/**/*.o", "/top.txt", "**/tmp"], "/r"
+        )
+        for rel, expect in [
+            ("build/x.o", True),
+            ("build/a/b/x.o", True),
+            ("src/build/x.o", False),
+            ("build/x.c", False),
+            ("top.txt", True),
+            ("a/top.txt", False),
+            ("tmp", True),
+            ("a/b/tmp", True),
+        ]:
+            with self.subTest(rel=rel):
+                self.assertIgnored(ignore, rel, expect)
+
+    def test_star_stays_in_component(self):
+        ignore = Ignore(["a/*.o"], "/r")
+        self.assertIgnored(ignore, "a/b/x.o", False)
+
+    def test_newline_in_path(self):
+        ignore = Ignore(["*.pyc", "build/**/*.o"], "/r")
+        for rel in [
+            "x\ny/a.pyc",
+            "a\n.pyc",
+            "build/x\ny/a.o",
+        ]:
+            with self.subTest(rel=rel):
+                self.assertIgnored(ignore, rel)
+
+    def test_double_star_in_name(self):
+        # no "/", so "**" is "*" and the same as fnmatch
+        for patt in ["a**b", "?**[!a]", "**.log"]:
+            ignore = Ignore([patt], "/r")
+            for name in [
+                "ab",
+                "axyb",
+                "b",
+                "xa",
+                "xb",
+                "x.log",
+            ]:
+                with self.subTest(patt=patt, name=name):
+                    self.assertIgnored(
+                        ignore,
+                        name,
+                        fnmatchcase(name, patt),
+                    )
+        with self.subTest("one component"):
+            self.assertIgnored(
+                Ignore(["a**b"], "/r"), "a/x/b", False
+            )
+
+    def test_no_patterns(self):
+        self.assertIgnored(Ignore(), "x", False)
+
+
+class TestDirCache(TestCase):
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+        os.makedirs(self.join("sub", "skip"))
+        for name in (
+            "a.txt",
+            "sub/b.txt",
+            "sub/skip/c.txt",
+        ):
+            open(self.join(name), "w").close()
+        self.age()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def join(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def age(self):
+        # push dir mtimes out of the racy window
+        past = time() - 60
+        for path in ("", "sub", "sub/skip"):
+            os.utime(self.join(path), (past, past))
+
+    def test_scan(self):
+        cache = DirCache(self.root, ignore_dirs=("skip",))
+        expect = [
+            self.join("a.txt"),
+            self.join("sub", "b.txt"),
+        ]
+        self.assertEqual(
+            sorted(expect), sorted(cache.scan())
+        )
+
+    def test_unchanged_dirs_not_listed(self):
+        cache = DirCache(self.root)
+        expect = cache.scan()
+        with patch("watch.watch.scandir") as mock_scandir:
+            actual = cache.scan()
+        with self.subTest(msg="no listing"):
+            mock_scandir.assert_not_called()
+        with self.subTest(msg="same files"):
+            self.assertEqual(expect, actual)
+
+    def test_changed_dir_relisted(self):
+        cache = DirCache(self.root)
+        cache.scan()
+        open(self.join("sub", "new.txt"), "w").close()
+        os.remove(self.join("a.txt"))
+
+        actual = cache.scan()
+        with self.subTest(msg="created"):
+            self.assertIn(
+                self.join("sub", "new.txt"), actual
+            )
+        with self.subTest(msg="removed"):
+            self.assertNotIn(self.join("a.txt"), actual)
+
+    def test_incremental_watch(self):
+        watch = Watch(self.root, incremental=True)
+        open(self.join("sub", "new.txt"), "w").close()
+        self.assertEqual(
+            [self.join("sub", "new.txt")], watch.created
+        )
+
+
+@skipUnless(sys.platform.startswith("linux"), "inotify")
+class TestInotifyWatch(TestCase):
+    def setUp(self):
+        self._tmp = TemporaryDirectory()
+        self.root = os.path.realpath(self._tmp.name)
+        os.makedirs(self.join("sub"))
+        open(self.join("sub", "a.txt"), "w").close()
+        self.watch = InotifyWatch(
+            self.root,
+            ignore_dirs=("skip",),
+            ignore_files=("*.log",),
+        )
+
+    def tearDown(self):
+        self.watch.close()
+        self._tmp.cleanup()
+
+    def join(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_files(self):
+        self.assertEqual(
+            self.watch.files, [self.join("sub", "a.txt")]
+        )
+
+    def test_created(self):
+        os.makedirs(self.join("new", "deeper"))
+        open(
+            self.join("new", "deeper", "b.txt"), "w"
+        ).close()
+        open(self.join("c.log"), "w").close()
+        os.makedirs(self.join("skip"))
+        open(self.join("skip", "d.txt"), "w").close()
+        with self.subTest(msg="new tree"):
+            self.assertEqual(
+                self.watch.created,
+                [self.join("new", "deeper", "b.txt")],
+            )
+
+        # watches were added on the way, so this is an event
+        open(
+            self.join("new", "deeper", "e.txt"), "w"
+        ).close()
+        with self.subTest(msg="inside new tree"):
+            self.assertEqual(
+                sorted(self.watch.created),
+                [
+                    self.join("new", "deeper", "b.txt"),
+                    self.join("new", "deeper", "e.txt"),
+                ],
+            )
+
+    def test_dir_symlink(self):
+        os.symlink(self.join("sub"), self.join("link"))
+        with self.subTest(msg="not a file"):
+            self.assertEqual(self.watch.created, [])
+        self.watch.ack()
+        with self.subTest(msg="same as a walk"):
+            self.assertEqual(
+                self.watch.files, Watch(self.root).files
+            )
+
+    def test_dir_attrib(self):
+        os.chmod(self.join("sub"), 0o700)
+        os.utime(self.join("sub"), (1, 1))
+        with patch.object(self.watch, "_add_tree") as add:
+            self.assertEqual(
+                self.watch.poll(), Changes({}, {}, {})
+            )
+        add.assert_not_called()
+
+    def test_modified(self):
+        os.utime(self.join("sub", "a.txt"), (1, 1))
+        self.assertEqual(
+            self.watch.modified,
+            [self.join("sub", "a.txt")],
+        )
+
+    def test_removed(self):
+        os.rename(self.join("sub"), self.join("gone"))
+        with self.subTest(msg="poll"):
+            self.assertEqual(
+                self.watch.poll(),
+                Changes(
+                    created={
+                        self.join("gone", "a.txt"): ANY
+                    },
+                    modified={},
+                    removed={
+                        self.join("sub", "a.txt"): ANY
+                    },
+                ),
+            )
+
+        self.watch.ack()
+        os.remove(self.join("gone", "a.txt"))
+        with self.subTest(msg="moved tree still watched"):
+            self.assertEqual(
+                self.watch.removed,
+                [self.join("gone", "a.txt")],
+            )
+
+    def test_changes(self):
+        async def run():
+            loop = asyncio.get_running_loop()
+            path = self.join("new.txt")
+            loop.call_later(
+                0.1, lambda: open(path, "w").close()
+            )
+            async for changes in self.watch.changes(
+                interval=60
+            ):
+                return changes
+
+        changes = asyncio.run(asyncio.wait_for(run(), 5))
+        self.assertEqual(
+            list(changes.created), [self.join("new.txt")]
+        )
+
+    def test_overflow_rescans(self):
+        self.watch._handle(
+            INOTIFY_EVENT.pack(-1, IN_Q_OVERFLOW, 0, 0)
+        )
+        with patch(
+            "watch.watch.all_files"
+        ) as mock_all_files:
+            mock_all_files.return_value = {}
+            removed = self.watch.removed
+        with self.subTest(msg="walked"):
+            mock_all_files.assert_called_once()
+        with self.subTest(msg="removed"):
+            self.assertEqual(
+                removed, [self.join("sub", "a.txt")]
+            )
@@ -1,13 +1,91 @@
-from copy import copy
-from fnmatch import fnmatch
-from typing import Dict
-from os import walk
-from os.path import abspath, getmtime, join
+import asyncio
+import ctypes
+import os
+import re
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    wait,
+)
+from array import array
+from ctypes.util import find_library
+from hashlib import blake2b
+from struct import Struct
+from sys import byteorder, platform
+from time import monotonic, time_ns
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from os import scandir, stat, walk
+from os.path import abspath, isdir, join
+
+_libc = None
+if platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(
+            find_library("c"), use_errno=True
+        )
+        _inotify_init1 = _libc.inotify_init1
+        _inotify_add_watch = _libc.inotify_add_watch
+        _inotify_rm_watch = _libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        # no inotify in this libc
+        _libc = None
 
 
 FileName = str
 ModTS = int
 Files = Dict[FileName, ModTS]
+# size, hash of the content
+Digest = Tuple[int, bytes]
+
+# directories modified this recently get listed again next time,
+# a change within the same (coarse) timestamp tick can't move
+# their mtime
+RACY_NS = 10**9
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+SNAPSHOT_HEADER = Struct("<8sQ")
+SNAPSHOT_MAGIC = b"WATCHSN1"
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+IN_WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_ONLYDIR
+    | IN_DONT_FOLLOW
+    | IN_EXCL_UNLINK
+)
+IN_GONE = IN_DELETE | IN_MOVED_FROM
+IN_NEW = IN_CREATE | IN_MOVED_TO
+
+# struct inotify_event, followed by `len` bytes of name
+INOTIFY_EVENT = Struct("iIII")
+INOTIFY_READ_SIZE = 64 * 1024
+
+
+class Changes(NamedTuple):
+    created: Files
+    modified: Files
+    removed: Files
 
 
 class Watch:
@@ -16,15 +94,42 @@ class Watch:
         path=".",
         ignore_dirs=(),
         ignore_files=(),
+        incremental=False,
+        workers=1,
+        snapshot=None,
+        content=False,
     ) -> None:
         self.path = path if path else "."
         self.ignore_dirs = ignore_dirs
         self.ignore_files = ignore_files
+        self.workers = workers
+        # compiled once, every entry of every walk goes by them
+        self._ignore_dirs = Ignore(ignore_dirs, self.path)
+        self._ignore_files = Ignore(
+            ignore_files, self.path
+        )
+        self._cache = (
+            DirCache(
+                self.path,
+                self._ignore_dirs,
+                self._ignore_files,
+            )
+            if incremental
+            else None
+        )
 
-        self._tracker = self._all_files()
+        self.snapshot = snapshot
+        self.content = content
+        self._tracker = self._baseline()
         self._created: Files = {}
         self._modified: Files = {}
         self._removed: Files = {}
+        # content mode: the digests of what's tracked, and of
+        # what's waiting for an ack
+        self._digests: Dict[FileName, Digest] = (
+            self._seed_digests() if content else {}
+        )
+        self._hashed: Dict[FileName, Digest] = {}
 
     @property
     def files(self):
@@ -41,6 +146,11 @@ class Watch:
         mod = modified_files(
             self._tracker, self._all_files()
         )
+        if self.content:
+            self._hashed.update(
+                _hash_files(mod, self.workers)
+            )
+            mod = self._changed_content(mod)
         self._modified = mod
         return list(self._modified)
 
@@ -52,7 +162,28 @@ class Watch:
         self._removed = rmd
         return list(self._removed)
 
+    def poll(self) -> Changes:
+        # one walk for all three, so they agree with each other
+        # and `ack` applies exactly what was returned
+        changes = diff(self._tracker, self._all_files())
+        self._created = changes.created
+        self._modified = changes.modified
+        self._removed = changes.removed
+        if self.content:
+            self._hashed = _hash_files(
+                [*self._created, *self._modified],
+                self.workers,
+            )
+            self._modified = self._changed_content(
+                self._modified
+            )
+        return Changes(
+            self._created, self._modified, self._removed
+        )
+
     def ack(self):
+        if self.content:
+            self._ack_digests()
         for file, ts in self._created.items():
             self._tracker[file] = ts
             self._created = {}
@@ -63,13 +194,415 @@ class Watch:
             del self._tracker[file]
             self._removed = {}
 
+    def _changed_content(self, modified):
+        # the mtime only tells us which files to read: same size
+        # and digest means somebody just touched it (or rewrote
+        # the same bytes). Take the new mtime right away so it
+        # isn't read again next time
+        changed = {}
+        for file, ts in modified.items():
+            digest = self._hashed.get(file)
+            if (
+                digest is not None
+                and digest == self._digests.get(file)
+            ):
+                self._tracker[file] = ts
+                continue
+            changed[file] = ts
+        return changed
+
+    def _ack_digests(self):
+        files = [*self._created, *self._modified]
+        missing = [
+            file
+            for file in files
+            if file not in self._hashed
+        ]
+        self._hashed.update(
+            _hash_files(missing, self.workers)
+        )
+        for file in files:
+            if file in self._hashed:
+                self._digests[file] = self._hashed[file]
+        for file in self._removed:
+            self._digests.pop(file, None)
+        self._hashed = {}
+
+    async def changes(self, interval=1.0):
+        # the walks run in the default executor, one at a time,
+        # so the loop only ever waits on them. Acks what it yields
+        loop = asyncio.get_running_loop()
+        while True:
+            changes = await loop.run_in_executor(
+                None, self.poll
+            )
+            if any(changes):
+                self.ack()
+                yield changes
+            await self._wait(interval)
+
+    async def _wait(self, interval):
+        await asyncio.sleep(interval)
+
+    def save(self, path=None):
+        # what's been acked, so whatever wasn't gets reported
+        # again by a Watch loaded from it
+        path = path or self.snapshot
+        if path is None:
+            raise ValueError("No snapshot path to save to")
+        save_files(self._tracker, path)
+
+    def _baseline(self):
+        if self.snapshot is not None:
+            try:
+                return load_files(self.snapshot)
+            except FileNotFoundError:
+                pass
+        return self._all_files()
+
+    def _seed_digests(self) -> Dict[FileName, Digest]:
+        # a snapshot says what the files were, not what they
+        # hash to now: whatever moved since it was saved gets no
+        # digest, so its new mtime reports it as modified
+        # instead of taking its current bytes as the baseline
+        files = list(self._tracker)
+        if self.snapshot is not None:
+            files = [
+                file
+                for file in files
+                if _stat_ts(file) == self._tracker[file]
+            ]
+        return _hash_files(files, self.workers)
+
     def _all_files(self):
+        if self._cache is not None:
+            return self._cache.scan()
         all = all_files(
-            self.path, self.ignore_dirs, self.ignore_files
+            self.path,
+            self._ignore_dirs,
+            self._ignore_files,
+            self.workers,
         )
         return all
 
 
+class Debounce:
+    # batches a Watch's changes: a batch goes out once nothing
+    # changed for `quiet` seconds, or `max_latency` seconds after
+    # its first change if things keep changing. Within a batch
+    # create+modify is a create, modify+remove a remove,
+    # remove+create a modify and create+remove nothing at all.
+    # Acks the watch as it goes, batches need no ack
+    def __init__(
+        self,
+        watch,
+        quiet=0.1,
+        max_latency=1.0,
+        clock=monotonic,
+    ) -> None:
+        self.watch = watch
+        self.quiet = quiet
+        self.max_latency = max_latency
+        self._clock = clock
+        self._created: Files = {}
+        self._modified: Files = {}
+        self._removed: Files = {}
+        self._first: Optional[float] = None
+        self._last = 0.0
+
+    def poll(self) -> Optional[Changes]:
+        now = self._clock()
+        changes = self.watch.poll()
+        self.watch.ack()
+        if any(changes):
+            self._merge(changes)
+            self._last = now
+            if self._first is None:
+                self._first = now
+        if self._first is None:
+            return None
+        if (
+            now - self._last < self.quiet
+            and now - self._first < self.max_latency
+        ):
+            return None
+        batch = Changes(
+            self._created, self._modified, self._removed
+        )
+        self._reset()
+        # everything may have cancelled out
+        return batch if any(batch) else None
+
+    def _reset(self):
+        self._created = {}
+        self._modified = {}
+        self._removed = {}
+        self._first = None
+
+    def _merge(self, changes):
+        for file, ts in changes.created.items():
+            if self._removed.pop(file, None) is not None:
+                self._modified[file] = ts
+            else:
+                self._created[file] = ts
+        for file, ts in changes.modified.items():
+            if file in self._created:
+                self._created[file] = ts
+            else:
+                self._modified[file] = ts
+        for file, ts in changes.removed.items():
+            if self._created.pop(file, None) is not None:
+                continue
+            self._modified.pop(file, None)
+            self._removed[file] = ts
+
+
+class InotifyWatch(Watch):
+    # same surface as Watch, but keeps its file table up to date
+    # from inotify events instead of walking the tree, so checks
+    # cost a non-blocking read when nothing changed. Linux only
+    def __init__(
+        self, path=".", ignore_dirs=(), ignore_files=()
+    ) -> None:
+        if _libc is None:
+            raise OSError("inotify is not available")
+        fd = _inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        self._wds: Dict[int, str] = {}
+        self._current: Files = {}
+        self._stale = True
+        super().__init__(path, ignore_dirs, ignore_files)
+
+    def fileno(self):
+        # readable when there are events, for select/poll users
+        return self._fd
+
+    async def _wait(self, interval):
+        # wake up on the first event instead of the next tick
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(
+            self._fd,
+            lambda: ready.done() or ready.set_result(None),
+        )
+        try:
+            await asyncio.wait_for(ready, interval)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(self._fd)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _all_files(self):
+        self._drain()
+        if self._stale:
+            self._rescan()
+        return dict(self._current)
+
+    def _drain(self):
+        while True:
+            try:
+                buf = os.read(self._fd, INOTIFY_READ_SIZE)
+            except BlockingIOError:
+                return
+            self._handle(buf)
+
+    def _handle(self, buf):
+        offset = 0
+        while offset < len(buf):
+            (
+                wd,
+                mask,
+                _,
+                length,
+            ) = INOTIFY_EVENT.unpack_from(buf, offset)
+            offset += INOTIFY_EVENT.size
+            stop = offset + length
+            name = os.fsdecode(
+                buf[offset:stop].rstrip(b"\0")
+            )
+            offset = stop
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, only a full walk can tell
+                self._stale = True
+                continue
+            if mask & IN_IGNORED:
+                self._wds.pop(wd, None)
+                continue
+            root = self._wds.get(wd)
+            if root is None or not name:
+                continue
+            path = join(root, name)
+            if mask & IN_ISDIR:
+                if self._ignore_dirs(name, path):
+                    continue
+                # a chmod / touch of a directory changes
+                # nothing underneath it, no need to walk it
+                if mask & IN_GONE:
+                    self._forget(path)
+                elif mask & IN_NEW:
+                    self._add_tree(path)
+                continue
+            if self._ignore_files(name, path):
+                continue
+            if mask & IN_GONE or isdir(path):
+                # a link to a directory comes without
+                # IN_ISDIR, left out like _list_dir does
+                self._current.pop(path, None)
+                continue
+            try:
+                self._current[path] = _mod_ts(path)
+            except OSError:
+                self._current.pop(path, None)
+
+    def _rescan(self):
+        # watches first, so nothing slips in between the walk
+        # and the watch being added
+        self._stale = False
+        self._add_watches(abspath(self.path))
+        self._current = all_files(
+            self.path,
+            self._ignore_dirs,
+            self._ignore_files,
+        )
+
+    def _add_tree(self, path):
+        self._add_watches(path)
+        self._current.update(
+            all_files(
+                path, self._ignore_dirs, self._ignore_files
+            )
+        )
+
+    def _add_watches(self, path):
+        for root, dirs, _ in walk(path):
+            dirs[:] = [
+                dir
+                for dir in dirs
+                if not self._ignore_dirs(
+                    dir, join(root, dir)
+                )
+            ]
+            wd = _inotify_add_watch(
+                self._fd, os.fsencode(root), IN_WATCH_MASK
+            )
+            if wd >= 0:
+                self._wds[wd] = root
+
+    def _forget(self, path):
+        prefix = join(path, "")
+        for file in list(self._current):
+            if file.startswith(prefix):
+                del self._current[file]
+        for wd, root in list(self._wds.items()):
+            if root == path or root.startswith(prefix):
+                # moved away, the kernel keeps watching it
+                _inotify_rm_watch(self._fd, wd)
+                del self._wds[wd]
+
+
+class Listing(NamedTuple):
+    mtime: int
+    listed: int
+    files: Files
+    dirs: List[str]
+
+
+class DirCache:
+    # remembers each directory's mtime and listing, so a rescan
+    # only lists and stats the entries of directories whose mtime
+    # moved. That only happens when entries are added, removed or
+    # renamed: files edited in place in an otherwise untouched
+    # directory go unnoticed (editors saving via rename are fine)
+    def __init__(
+        self, path=".", ignore_dirs=(), ignore_files=()
+    ) -> None:
+        self.path = path
+        self.ignore_dirs = _compile(ignore_dirs, path)
+        self.ignore_files = _compile(ignore_files, path)
+        self._dirs: Dict[str, Listing] = {}
+
+    def scan(self) -> Files:
+        files: Files = {}
+        seen: Dict[str, Listing] = {}
+        stack = [abspath(self.path)]
+        while stack:
+            root = stack.pop()
+            try:
+                mtime = stat(root).st_mtime_ns
+            except OSError:
+                continue
+            listing = self._dirs.get(root)
+            if (
+                listing is None
+                or listing.mtime != mtime
+                or listing.listed - mtime < RACY_NS
+            ):
+                listing = self._list(root, mtime)
+            seen[root] = listing
+            files.update(listing.files)
+            stack.extend(listing.dirs)
+        self._dirs = seen
+        return files
+
+    def _list(self, root, mtime) -> Listing:
+        listed = time_ns()
+        files, dirs = _list_dir(
+            root, self.ignore_dirs, self.ignore_files
+        )
+        return Listing(mtime, listed, files, dirs)
+
+
+class Ignore:
+    # ignore patterns compiled once: plain names go in a set and
+    # everything else into one regex over the entry's path.
+    # Patterns without a "/" match the name at any depth,
+    # patterns with one are gitignore-style paths from `root`
+    # ("build/**/*.o", "/docs/_build")
+    def __init__(self, patterns=(), root=".") -> None:
+        self.patterns = tuple(patterns)
+        self._names = set()
+        regexes = []
+        prefix = re.escape(join(abspath(root), ""))
+        anywhere = f".*{re.escape(os.sep)}"
+        for patt in self.patterns:
+            patt = patt.rstrip("/")
+            if "/" in patt:
+                body = _translate(patt.lstrip("/"))
+                regexes.append(prefix + body)
+            elif _is_glob(patt):
+                regexes.append(anywhere + _translate(patt))
+            else:
+                self._names.add(patt)
+        self._regex = (
+            # DOTALL: names can have newlines, like fnmatch
+            re.compile("|".join(regexes), re.DOTALL)
+            if regexes
+            else None
+        )
+
+    def __call__(self, name, path) -> bool:
+        if name in self._names:
+            return True
+        if self._regex is None:
+            return False
+        return self._regex.fullmatch(path) is not None
+
+
 # ---------------------------------------------------------
 def new_files(tracker: Files, all: Files) -> Files:
     return {
@@ -90,40 +623,282 @@ def removed_files(tracker: Files, all: Files) -> Files:
 def modified_files(tracker: Files, all: Files) -> Files:
     modified = {}
     for file, trk_ts in tracker.items():
-        cur_ts = all[file]
-        if cur_ts != trk_ts:
+        cur_ts = all.get(file)
+        if cur_ts is not None and cur_ts != trk_ts:
             modified[file] = cur_ts
     return modified
 
 
+def diff(tracker: Files, all: Files) -> Changes:
+    # the key view differences are set ops in C and only as big
+    # as the changes, then a single pass for the mtimes
+    created = {
+        file: all[file] for file in all.keys() - tracker
+    }
+    removed = {
+        file: tracker[file]
+        for file in tracker.keys() - all
+    }
+    get = tracker.get
+    modified = {
+        file: ts
+        for file, ts in all.items()
+        if get(file, ts) != ts
+    }
+    return Changes(created, modified, removed)
+
+
 # ---------------------------------------------------------
 def all_files(
-    path=".", ignore_dirs=(), ignore_files=()
+    path=".", ignore_dirs=(), ignore_files=(), workers=1
 ) -> Files:
-    def _list_gen():
-        nonlocal path
-        for root, dirs, files in walk(path):
-            # TODO: needs some DRYing up
-            dirs_c = copy(dirs)
-            for dir in dirs_c:
-                for patt in ignore_dirs:
-                    if fnmatch(dir, patt):
-                        dirs.remove(dir)
-
-            files_c = copy(files)
-            for file in files_c:
-                for patt in ignore_files:
-                    if fnmatch(file, patt):
-                        files.remove(file)
-
-            for file in files:
-                path = abspath(join(root, file))
-                modts = _mod_ts(path)
-                yield (path, modts)
-
-    return dict(_list_gen())
+    ignore_dirs = _compile(ignore_dirs, path)
+    ignore_files = _compile(ignore_files, path)
+    if workers > 1:
+        return _all_files_parallel(
+            path, ignore_dirs, ignore_files, workers
+        )
+    all: Files = {}
+    stack = [abspath(path)]
+    while stack:
+        files, dirs = _list_dir(
+            stack.pop(), ignore_dirs, ignore_files
+        )
+        all.update(files)
+        stack.extend(dirs)
+    return all
+
+
+def _all_files_parallel(
+    path, ignore_dirs, ignore_files, workers
+) -> Files:
+    # one directory (listing + stats) per task. Helps where
+    # each stat is a round trip (NFS & co), not on local disks
+    all: Files = {}
+    pending = [abspath(path)]
+    running: set = set()
+    with ThreadPoolExecutor(workers) as pool:
+        while pending or running:
+            # bounded: the rest of the tree waits as plain paths
+            while pending and len(running) < 2 * workers:
+                running.add(
+                    pool.submit(
+                        _list_dir,
+                        pending.pop(),
+                        ignore_dirs,
+                        ignore_files,
+                    )
+                )
+            done, running = wait(
+                running, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                files, dirs = future.result()
+                all.update(files)
+                pending.extend(dirs)
+    return all
+
+
+def _list_dir(
+    root, ignore_dirs, ignore_files
+) -> Tuple[Files, List[str]]:
+    # entry paths are already absolute when root is, and
+    # entry.stat() is the only syscall per file
+    files: Files = {}
+    dirs: List[str] = []
+    try:
+        entries = list(scandir(root))
+    except OSError:
+        return files, dirs
+    for entry in entries:
+        if entry.is_dir():
+            # like os.walk, don't follow links into dirs
+            ignored = ignore_dirs(entry.name, entry.path)
+            if not (ignored or entry.is_symlink()):
+                dirs.append(entry.path)
+            continue
+        if ignore_files(entry.name, entry.path):
+            continue
+        try:
+            files[entry.path] = entry.stat().st_mtime_ns
+        except OSError:
+            # gone since we listed it, or a dangling link
+            continue
+    return files, dirs
+
+
+# ---------------------------------------------------------
+def save_files(files: Files, path) -> None:
+    # header, the mtimes packed in sorted path order, then the
+    # NUL separated paths
+    names = sorted(files)
+    mtimes = array("q", (files[name] for name in names))
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as handler:
+        handler.write(
+            SNAPSHOT_HEADER.pack(
+                SNAPSHOT_MAGIC, len(names)
+            )
+        )
+        _write_array(handler, mtimes)
+        handler.write(b"\0".join(map(os.fsencode, names)))
+    # a crash mid-write leaves the old snapshot in place
+    os.replace(tmp, path)
+
+
+def load_files(path) -> Files:
+    with open(path, "rb") as handler:
+        header = handler.read(SNAPSHOT_HEADER.size)
+        if len(header) != SNAPSHOT_HEADER.size:
+            raise ValueError(
+                f"{path} is not a watch snapshot"
+            )
+        magic, count = SNAPSHOT_HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(
+                f"{path} is not a watch snapshot"
+            )
+        try:
+            mtimes = _read_array(handler, count)
+        except EOFError:
+            raise ValueError(
+                f"{path} is truncated"
+            ) from None
+        names = (
+            handler.read().split(b"\0") if count else []
+        )
+    if len(names) != count:
+        raise ValueError(
+            f"{path} lists {len(names)} paths, expected {count}"
+        )
+    return dict(zip(map(os.fsdecode, names), mtimes))
+
+
+def _write_array(handler, values):
+    if byteorder == "big":
+        values.byteswap()
+    values.tofile(handler)
+
+
+def _read_array(handler, count):
+    values = array("q")
+    values.fromfile(handler, count)
+    if byteorder == "big":
+        values.byteswap()
+    return values
 
 
 # ---------------------------------------------------------
+def _hash_files(
+    files, workers=1
+) -> Dict[FileName, Digest]:
+    files = list(files)
+    if not files:
+        return {}
+    with ThreadPoolExecutor(workers) as pool:
+        digests = pool.map(_digest, files)
+        return {
+            file: digest
+            for file, digest in zip(files, digests)
+            if digest is not None
+        }
+
+
+def _digest(path) -> Optional[Digest]:
+    hasher = blake2b(digest_size=16)
+    size = 0
+    try:
+        with open(path, "rb") as handler:
+            while block := handler.read(HASH_BLOCK_SIZE):
+                hasher.update(block)
+                size += len(block)
+    except OSError:
+        # gone, it'll show up as removed
+        return None
+    return size, hasher.digest()
+
+
 def _mod_ts(file):
-    return int(getmtime(file))
+    return stat(file).st_mtime_ns
+
+
+def _stat_ts(file) -> Optional[int]:
+    try:
+        return _mod_ts(file)
+    except OSError:
+        return None
+
+
+def _compile(patterns, root) -> "Ignore":
+    if isinstance(patterns, Ignore):
+        return patterns
+    return Ignore(patterns, root)
+
+
+def _is_glob(pattern):
+    return any(char in pattern for char in "*?[")
+
+
+def _translate(pattern, sep=re.escape(os.sep)):
+    # glob -> regex, where "*", "?" and "[...]" stay within one
+    # path component and "**" spans any number of them. A name
+    # has only the one component, there "**" is just "*"
+    spans = "/" in pattern
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append(f"(?:.*{sep})?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*" if spans else f"[^{sep}]*")
+            i += 2
+            continue
+        char = pattern[i]
+        i += 1
+        if char == "*":
+            out.append(f"[^{sep}]*")
+        elif char == "?":
+            out.append(f"[^{sep}]")
+        elif char == "/":
+            out.append(sep)
+        elif char == "[":
+            # like fnmatch, a leading "]" is part of the set
+            start = (
+                i + 1 if pattern.startswith("!", i) else i
+            )
+            stop = pattern.find("]", start + 1)
+            if stop < 0:
+                out.append("\\[")
+                continue
+            chars = pattern[i:stop]
+            negate = chars.startswith("!")
+            if negate:
+                chars = chars[1:]
+            out.append(_charset(chars, negate, sep))
+            i = stop + 1
+        else:
+            out.append(re.escape(char))
+    return "".join(out)
+
+
+def _charset(chars, negate, sep):
+    items = []
+    k = 0
+    while k < len(chars):
+        if k + 2 < len(chars) and chars[k + 1] == "-":
+            low, high = chars[k], chars[k + 2]
+            k += 3
+            # like fnmatch, reversed ranges match nothing
+            if low <= high:
+                items.append(
+                    f"{re.escape(low)}-{re.escape(high)}"
+                )
+            continue
+        items.append(re.escape(chars[k]))
+        k += 1
+    body = "".join(items)
+    if negate:
+        return f"[^{sep}{body}]"
+    return f"[{body}]" if body else "(?!)"